@@ -4,6 +4,15 @@
 
 from .renderer import *
 from .camera import *
+from .cache import *
 from .shot import *
+from .shotset import *
+from .packed import *
+from .readback import *
+from .residency import *
+from .upload import *
+from .culling import *
+from .index import *
+from .pool import *
 from .utils import *
 from .globals import __version__
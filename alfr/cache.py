@@ -0,0 +1,132 @@
+import os
+import weakref
+from collections import OrderedDict
+from typing import Hashable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import moderngl
+
+
+class TextureCache:
+    """Textures of image files shared between shots of one OpenGL context.
+
+    Textures are keyed by the file path, its modification time and the parameters that
+    change the texture (storage format, mipmaps, scale), so shots of the same image share
+    one texture and a modified file is loaded again. The cache counts the shots using a
+    texture. Textures no shot uses anymore are kept up to a memory budget, such that
+    loading the same dataset again (e.g., with corrected poses) skips decoding and uploading.
+    """
+
+    _shared = weakref.WeakKeyDictionary()
+
+    def __init__(self, ctx: "moderngl.Context", unused_budget: int = 256 * 2**20):
+        """Create a cache.
+
+        Args:
+            ctx (moderngl.Context): the OpenGL context of the textures
+            unused_budget (int): bytes of textures without users that are kept for reuse
+        """
+        self._ctx = ctx
+        self._unused_budget = unused_budget
+        self._entries = {}  # key -> [texture, users, bytes]
+        self._unused = OrderedDict()  # keys of textures without users, in LRU order
+        self._unused_bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def for_context(cls, ctx: "moderngl.Context") -> "TextureCache":
+        """The cache shared by all users of the given context."""
+        cache = cls._shared.get(ctx)
+        if cache is None:
+            cache = cls._shared[ctx] = cls(ctx)
+        return cache
+
+    @staticmethod
+    def key(filename: str, *params: Hashable) -> tuple:
+        """The key of an image file, including its modification time.
+
+        Args:
+            filename (str): the image file
+            params (Hashable): the parameters the texture was created with
+        """
+        path = os.path.realpath(filename)
+        return (path, os.stat(path).st_mtime_ns, *params)
+
+    @property
+    def ctx(self) -> "moderngl.Context":
+        """The OpenGL context of the textures."""
+        return self._ctx
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._entries
+
+    def stats(self) -> dict:
+        """The number of hits, misses, textures and unused textures."""
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "textures": len(self._entries),
+            "unused": len(self._unused),
+            "unused_bytes": self._unused_bytes,
+        }
+
+    def acquire(self, key: tuple) -> "moderngl.Texture":
+        """Get the texture for the key and count a user, None if it is not cached."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        if entry[1] == 0:
+            del self._unused[key]
+            self._unused_bytes -= entry[2]
+        entry[1] += 1
+        return entry[0]
+
+    def add(self, key: tuple, texture: "moderngl.Texture", nbytes: int):
+        """Add a new texture with one user.
+
+        Args:
+            key (tuple): the key of the texture, see ``key``
+            texture (moderngl.Texture): the texture
+            nbytes (int): the (estimated) GPU memory used by the texture
+        """
+        if key in self._entries:
+            raise ValueError(f"The texture of {key} is already cached!")
+        self._entries[key] = [texture, 1, nbytes]
+
+    def release(self, key: tuple, keep: bool = True):
+        """Remove a user of the texture.
+
+        Args:
+            key (tuple): the key of the texture
+            keep (bool): keep the texture for reuse (within the budget) if it has no users
+                anymore, else release it right away
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] == 0:
+            if not keep:
+                del self._entries[key]
+                entry[0].release()
+                return
+            self._unused[key] = None
+            self._unused_bytes += entry[2]
+            self._trim(self._unused_budget)
+
+    def clear(self):
+        """Release all textures without users."""
+        self._trim(0)
+
+    def _trim(self, budget: int):
+        while self._unused_bytes > budget:
+            key, _ = self._unused.popitem(last=False)
+            texture, _, nbytes = self._entries.pop(key)
+            texture.release()
+            self._unused_bytes -= nbytes
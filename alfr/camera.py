@@ -9,6 +9,24 @@ from pyrr import Matrix44, Quaternion, Vector3, vector
 
 
 class Camera:
+    # no instance dict, shots are created by the thousands
+    __slots__ = (
+        "_field_of_view_degrees",
+        "_z_near",
+        "_z_far",
+        "_ratio",
+        "_camera_position",
+        "_rotation",
+        "_camera_front",
+        "_camera_up",
+        "_cameras_target",
+        "_projection_matrix",
+        "_view_matrix",
+        "_projection_matrix_f4",
+        "_view_matrix_f4",
+        "__weakref__",
+    )
+
     def __init__(
         self,
         field_of_view_degrees: float = 60,
@@ -38,6 +56,16 @@ class Camera:
             self._rotation = Quaternion.from_matrix(self._build_look_at())
 
         self._cameras_target = self._camera_position + self._camera_front
+        self._invalidate_projection()
+        self._invalidate_view()
+
+    def _invalidate_projection(self):
+        self._projection_matrix = None
+        self._projection_matrix_f4 = None
+
+    def _invalidate_view(self):
+        self._view_matrix = None
+        self._view_matrix_f4 = None
 
     @property
     def position(self) -> Vector3:
@@ -47,6 +75,7 @@ class Camera:
     @position.setter
     def position(self, position: Vector3):
         self._camera_position = position
+        self._invalidate_view()
         # print("camera.position(setter):", self._camera_position)
 
     @property
@@ -56,11 +85,17 @@ class Camera:
     @fov_degree.setter
     def fov_degree(self, fov_degree: float):
         self._field_of_view_degrees = fov_degree
+        self._invalidate_projection()
 
     @property
     def rotation(self) -> Quaternion:
         return self._rotation
 
+    @rotation.setter
+    def rotation(self, rotation: Quaternion):
+        self._rotation = rotation
+        self._invalidate_view()
+
     @property
     def aspect_ratio(self) -> float:
         return self._ratio
@@ -68,18 +103,49 @@ class Camera:
     @aspect_ratio.setter
     def aspect_ratio(self, ratio: float):
         self._ratio = ratio
+        self._invalidate_projection()
+
+    @property
+    def z_near(self) -> float:
+        return self._z_near
+
+    @property
+    def z_far(self) -> float:
+        return self._z_far
+
+    # the matrices are cached until a setter changes the camera; modifying the position
+    # or rotation in place does not update them, assign them (again) instead
 
     @property
     def projection_matrix(self) -> Matrix44:
-        return Matrix44.perspective_projection(
-            self._field_of_view_degrees, self._ratio, self._z_near, self._z_far
-        )
+        if self._projection_matrix is None:
+            self._projection_matrix = Matrix44.perspective_projection(
+                self._field_of_view_degrees, self._ratio, self._z_near, self._z_far
+            )
+        return self._projection_matrix
 
     @property
     def view_matrix(self) -> Matrix44:
-        return Matrix44.from_quaternion(self.rotation) * Matrix44.from_translation(
-            -self.position
-        )
+        if self._view_matrix is None:
+            rotation = Matrix44.from_quaternion(self.rotation)
+            self._view_matrix = rotation * Matrix44.from_translation(-self.position)
+        return self._view_matrix
+
+    @property
+    def projection_matrix_f4(self) -> np.ndarray:
+        """The projection matrix as contiguous float32 array, as uploaded to the GPU."""
+        if self._projection_matrix_f4 is None:
+            self._projection_matrix_f4 = np.ascontiguousarray(
+                self.projection_matrix, dtype="f4"
+            )
+        return self._projection_matrix_f4
+
+    @property
+    def view_matrix_f4(self) -> np.ndarray:
+        """The view matrix as contiguous float32 array, as uploaded to the GPU."""
+        if self._view_matrix_f4 is None:
+            self._view_matrix_f4 = np.ascontiguousarray(self.view_matrix, dtype="f4")
+        return self._view_matrix_f4
 
     def _build_look_at(self):
         self._cameras_target = self._camera_position + self._camera_front
@@ -105,6 +171,13 @@ class ControllableCamera(Camera):
         self._rotate_horizontally = 0.1
         self._rotate_vertically = 0.1
 
+    def build_projection(self):
+        self._invalidate_projection()
+
+    def build_look_at(self):
+        self._rotation = Quaternion.from_matrix(self._build_look_at())
+        self._invalidate_view()
+
     def zoom_in(self):
         self._field_of_view_degrees = self._field_of_view_degrees - self._zoom_step
         self.build_projection()
@@ -0,0 +1,79 @@
+import numpy as np
+from pyrr import Matrix44
+from typing import Tuple
+
+# corners of an image in normalized device coordinates (homogeneous x, y, w)
+_NDC_CORNERS = np.array(
+    [[-1.0, -1.0, 1.0], [1.0, -1.0, 1.0], [1.0, 1.0, 1.0], [-1.0, 1.0, 1.0]]
+)
+
+
+def plane_homographies(matrices: np.ndarray, model: Matrix44) -> np.ndarray:
+    """Homographies mapping points (u, v, 1) on the focal plane to clip space (x, y, w).
+
+    Args:
+        matrices (np.ndarray): projection * view matrices with shape (N, 4, 4), as stored by pyrr
+        model (Matrix44): the model matrix of the focal plane, see focal_plane_matrix
+
+    Returns:
+        np.ndarray: the homographies with shape (N, 3, 3)
+    """
+    # pyrr stores matrices transposed, so A * B in pyrr is B @ A in numpy
+    m = np.asarray(model, dtype=float) @ np.asarray(matrices, dtype=float)
+    m = np.transpose(m, (0, 2, 1))
+    return m[:, [0, 1, 3]][:, :, [0, 1, 3]]
+
+
+def shot_footprints(
+    shot_matrices: np.ndarray,
+    model: Matrix44,
+    vcam_matrix: Matrix44,
+    size: tuple,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Find the screen-space bounding boxes of the shots' footprints on the focal plane.
+
+    The corners of every shot's image are projected onto the focal plane and from there
+    into the virtual camera. Footprints that are unbounded (the plane reaches the shot's
+    horizon) or reach behind the virtual camera are kept and get the full viewport.
+
+    Args:
+        shot_matrices (np.ndarray): projection * view matrices of the shots with shape
+            (N, 4, 4), as stored by pyrr
+        model (Matrix44): the model matrix of the focal plane, see focal_plane_matrix
+        vcam_matrix (Matrix44): projection * view matrix of the virtual camera
+        size (tuple): the (width, height) of the framebuffer in pixels
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: a boolean array telling which shots contribute to
+            the image and an integer array of (x, y, width, height) scissor boxes in pixels,
+            with the origin at the bottom left
+    """
+    n = len(shot_matrices)
+    size = np.asarray(size)
+    full = np.array([0, 0, *size])
+    if n == 0:
+        return np.zeros(0, dtype=bool), np.zeros((0, 4), dtype=int)
+
+    homographies = plane_homographies(shot_matrices, model)
+    invertible = np.abs(np.linalg.det(homographies)) > 1e-12
+    homographies[~invertible] = np.identity(3)
+    corners = np.linalg.inv(homographies) @ _NDC_CORNERS.T  # (N, 3, 4)
+    corners = np.transpose(corners, (0, 2, 1))
+
+    # the rays through the image corners must hit the plane in front of the shot
+    bounded = invertible & np.all(corners[..., 2] > 0, axis=1)
+    corners = corners / np.where(bounded[:, None, None], corners[..., 2:], 1.0)
+
+    vcam = plane_homographies(np.asarray(vcam_matrix)[None], model)[0]
+    screen = corners @ vcam.T
+    bounded &= np.all(screen[..., 2] > 0, axis=1)
+    ndc = screen[..., :2] / np.where(bounded[:, None, None], screen[..., 2:], 1.0)
+
+    lo, hi = ndc.min(axis=1), ndc.max(axis=1)
+    overlaps = np.all(hi > -1.0, axis=1) & np.all(lo < 1.0, axis=1)
+    visible = ~bounded | overlaps
+
+    lo = np.floor((np.clip(lo, -1.0, 1.0) + 1.0) / 2.0 * size).astype(int)
+    hi = np.ceil((np.clip(hi, -1.0, 1.0) + 1.0) / 2.0 * size).astype(int)
+    boxes = np.where(bounded[:, None], np.hstack([lo, hi - lo]), full)
+    return visible, boxes
@@ -1,12 +1,13 @@
-import moderngl
-
 __version__ = "0.0.1"
 
 # initiate a global opengl context for usage in ipython notebooks and so on
 # ctx = moderngl.create_standalone_context()  # global OpenGL context
 
 
-import moderngl
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import moderngl
 
 
 class ContextManager:
@@ -17,10 +18,11 @@ class ContextManager:
     ctx = None
 
     @staticmethod
-    def get_default_context(allow_fallback_egl_context=True) -> moderngl.Context:
+    def get_default_context(allow_fallback_egl_context=True) -> "moderngl.Context":
         """
-        Default context
+        Default context, created on the first call
         """
+        import moderngl
 
         if ContextManager.ctx is None:
             try:
@@ -0,0 +1,333 @@
+import numpy as np
+from alfr.camera import Camera
+from alfr.shot import Shot
+from alfr.shotset import ShotSet
+from typing import List, Union
+
+# corners of the clip space cube as row vectors, bit k of the index is the sign of axis k
+_CLIP_CORNERS = np.array(
+    [[(i >> k & 1) * 2.0 - 1.0 for k in range(3)] + [1.0] for i in range(8)]
+)
+# the edges of the cube, pairs of corners that differ in one axis
+_CLIP_EDGES = np.array(
+    [(a, b) for a in range(8) for b in range(a + 1, 8) if bin(a ^ b).count("1") == 1]
+)
+# shots whose footprint covers more grid cells are tested by every frustum query
+_MAX_FOOTPRINT_CELLS = 64
+
+
+def _gather(order: np.ndarray, sorted_keys: np.ndarray, keys) -> np.ndarray:
+    """The entries of ``order`` whose (sorted) key is one of ``keys``."""
+    left = np.searchsorted(sorted_keys, keys, side="left")
+    counts = np.searchsorted(sorted_keys, keys, side="right") - left
+    starts = np.cumsum(counts) - counts  # of every key's entries in the result
+    return order[np.repeat(left - starts, counts) + np.arange(counts.sum())]
+
+
+class _FootprintGrid:
+    """2D grid over the footprints of shot frusta within a horizontal slab.
+
+    Every shot is listed in all cells overlapped by the bounding box of its footprint.
+    Shots with a huge footprint (e.g., looking at the horizon) are not listed, but are
+    candidates of every query.
+    """
+
+    def __init__(self, boxes: np.ndarray):
+        """Build the grid.
+
+        Args:
+            boxes (np.ndarray): the footprint (x0, y0, x1, y1) of every shot with shape
+                (N, 4), NaN if the frustum does not reach the slab
+        """
+        shots = np.flatnonzero(~np.isnan(boxes).any(axis=1))
+        boxes = boxes[shots]
+        # cells about half the size of a typical footprint
+        extents = (boxes[:, 2:] - boxes[:, :2]).max(axis=1) if len(shots) else [0.0]
+        self._cell_size = float(np.median(extents)) / 2.0 or 1.0
+
+        lo = np.floor(boxes[:, :2] / self._cell_size)
+        hi = np.floor(boxes[:, 2:] / self._cell_size)
+        small = np.prod(hi - lo + 1, axis=1) <= _MAX_FOOTPRINT_CELLS
+        self._large = shots[~small]
+        shots, lo, hi = shots[small], lo[small].astype(np.int64), hi[small]
+
+        self._offset = lo.min(axis=0) if len(shots) else np.zeros(2, dtype=np.int64)
+        lo = lo - self._offset
+        widths = hi.astype(np.int64) - self._offset - lo + 1
+        self._shape = (lo + widths).max(axis=0) if len(shots) else (0, 0)
+
+        # list every shot once per overlapped cell
+        counts = widths.prod(axis=1)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = np.repeat(widths[:, 1], counts)
+        x = np.repeat(lo[:, 0], counts) + within // rows
+        y = np.repeat(lo[:, 1], counts) + within % rows
+        keys = x * self._shape[1] + y
+        order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[order]
+        self._order = np.repeat(shots, counts)[order]
+
+    def candidates(self, point: np.ndarray) -> np.ndarray:
+        """Indices of the shots whose footprint may contain the point."""
+        x, y = np.floor(point[:2] / self._cell_size).astype(np.int64) - self._offset
+        if not (0 <= x < self._shape[0] and 0 <= y < self._shape[1]):
+            return self._large
+        found = _gather(self._order, self._sorted_keys, [x * self._shape[1] + y])
+        return np.concatenate([found, self._large])
+
+
+class ShotIndex:
+    """Spatial index over the poses of shots.
+
+    The shot positions are bucketed into a uniform grid, so nearest neighbour and radius
+    queries only look at the shots in the grid cells around the query point.
+    """
+
+    def __init__(self, shots: Union[List[Shot], ShotSet], cell_size: float = None):
+        """Build the index.
+
+        Args:
+            shots (List[Shot] | ShotSet): the shots to index
+            cell_size (float): the edge length of the grid cells, by default chosen such
+                that a cell holds about 8 shots
+        """
+        self._shot_set = shots if isinstance(shots, ShotSet) else ShotSet(shots)
+        self._shots = self._shot_set.shots
+        n = len(self._shots)
+        self._positions = self._shot_set.positions
+        self._directions = self._shot_set.directions()
+        self._matrices = None
+
+        self._origin = self._positions.min(axis=0) if n > 0 else np.zeros(3)
+        extent = self._positions.max(axis=0) - self._origin if n > 0 else np.zeros(3)
+        if cell_size is None:
+            dims = extent[extent > 0]
+            if len(dims) == 0:
+                cell_size = 1.0
+            else:
+                cell_size = (np.prod(dims) * 8.0 / n) ** (1.0 / len(dims))
+        self._cell_size = float(cell_size)
+        self._diagonal = float(np.linalg.norm(extent))
+
+        # the shots sorted by the (linear) key of their cell
+        cells = self._cell_of(self._positions)
+        self._grid_shape = cells.max(axis=0) + 1 if n > 0 else np.ones(3, np.int64)
+        keys = np.ravel_multi_index(cells.T, self._grid_shape)
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+
+        # frustum queries, see seeing_indices
+        self._corners = None
+        self._footprint_grids = {}  # slab -> _FootprintGrid
+
+    def _cell_of(self, points: np.ndarray) -> np.ndarray:
+        return np.floor((points - self._origin) / self._cell_size).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self._shots)
+
+    @property
+    def shots(self) -> List[Shot]:
+        """The indexed shots."""
+        return self._shots
+
+    @property
+    def positions(self) -> np.ndarray:
+        """The positions of the shots with shape (N, 3)."""
+        return self._positions
+
+    @property
+    def directions(self) -> np.ndarray:
+        """The normalized viewing directions of the shots with shape (N, 3)."""
+        return self._directions
+
+    def _candidates(self, point: np.ndarray, radius: float) -> np.ndarray:
+        """Indices of the shots in all grid cells overlapping the sphere."""
+        # only the cells of the grid, e.g., not below the shots of an aerial survey
+        lo = np.maximum(self._cell_of(point - radius), 0)
+        hi = np.minimum(self._cell_of(point + radius), self._grid_shape - 1)
+        if np.any(hi < lo):
+            return np.zeros(0, dtype=int)
+        if np.prod(hi - lo + 1) > len(self._shots):
+            return np.arange(len(self._shots))  # cheaper to look at all shots
+        axes = [np.arange(a, b + 1) for a, b in zip(lo, hi)]
+        cells = np.stack(np.meshgrid(*axes, indexing="ij")).reshape(3, -1)
+        keys = np.ravel_multi_index(cells, self._grid_shape)
+        return _gather(self._order, self._sorted_keys, keys)
+
+    def _filter_direction(
+        self, indices: np.ndarray, direction, max_angle_degrees: float
+    ) -> np.ndarray:
+        if direction is None or max_angle_degrees is None:
+            return indices
+        direction = np.asarray(direction, dtype=float)
+        direction = direction / np.linalg.norm(direction)
+        cos = self._directions[indices] @ direction
+        return indices[cos >= np.cos(np.radians(max_angle_degrees))]
+
+    def within_radius_indices(
+        self,
+        point,
+        radius: float,
+        direction=None,
+        max_angle_degrees: float = None,
+    ) -> np.ndarray:
+        """Indices of the shots within the radius, sorted by distance.
+
+        Args:
+            point: the query position
+            radius (float): the search radius
+            direction: optional viewing direction the shots have to match
+            max_angle_degrees (float): maximum angle between the viewing directions
+
+        Returns:
+            np.ndarray: the indices into ``shots``
+        """
+        point = np.asarray(point, dtype=float)
+        indices = self._candidates(point, radius)
+        distances = np.linalg.norm(self._positions[indices] - point, axis=1)
+        indices, distances = (
+            indices[distances <= radius],
+            distances[distances <= radius],
+        )
+        indices = indices[np.argsort(distances, kind="stable")]
+        return self._filter_direction(indices, direction, max_angle_degrees)
+
+    def within_radius(
+        self,
+        point,
+        radius: float,
+        direction=None,
+        max_angle_degrees: float = None,
+    ) -> List[Shot]:
+        """All shots within the radius around the point, sorted by distance.
+
+        See ``within_radius_indices`` for the arguments.
+        """
+        indices = self.within_radius_indices(
+            point, radius, direction, max_angle_degrees
+        )
+        return [self._shots[i] for i in indices]
+
+    def nearest_indices(
+        self,
+        point: Union[Camera, np.ndarray],
+        k: int = 1,
+        max_angle_degrees: float = None,
+    ) -> np.ndarray:
+        """Indices of the k shots nearest to a point or camera, sorted by distance.
+
+        Args:
+            point (Camera | np.ndarray): the query position or a (virtual) camera
+            k (int): the number of shots
+            max_angle_degrees (float): if a camera is given, only consider shots whose
+                viewing direction deviates at most this angle from the camera's
+
+        Returns:
+            np.ndarray: the indices into ``shots``
+        """
+        direction = None
+        if isinstance(point, Camera):
+            direction = -np.asarray(point.view_matrix)[:3, 2]
+            point = point.position
+        point = np.asarray(point, dtype=float)
+
+        # a sphere of this radius around the point contains all shots
+        max_radius = self._diagonal + np.linalg.norm(point - self._origin)
+        radius = self._cell_size
+        while True:
+            indices = self.within_radius_indices(
+                point, radius, direction, max_angle_degrees
+            )
+            # the sphere holds the k nearest shots once it holds k shots
+            if len(indices) >= k or radius > max_radius:
+                return indices[:k]
+            radius *= 2.0
+
+    def nearest(
+        self,
+        point: Union[Camera, np.ndarray],
+        k: int = 1,
+        max_angle_degrees: float = None,
+    ) -> List[Shot]:
+        """The k shots nearest to a point or camera, sorted by distance.
+
+        See ``nearest_indices`` for the arguments.
+        """
+        return [
+            self._shots[i] for i in self.nearest_indices(point, k, max_angle_degrees)
+        ]
+
+    def seeing_indices(self, point, max_distance: float = None) -> np.ndarray:
+        """Indices of the shots whose frustum contains the point.
+
+        The footprints of the frusta are indexed in a 2D grid per horizontal slab (of
+        ``cell_size`` height), which is built on the first query in the slab. Later
+        queries only test the frusta of the shots listed in the point's cell.
+
+        Args:
+            point: the (ground) point
+            max_distance (float): only return shots within this distance of the point
+
+        Returns:
+            np.ndarray: the sorted indices into ``shots``
+        """
+        if self._matrices is None:
+            self._matrices = self._shot_set.matrices()
+        point = np.asarray(point, dtype=float)
+        slab = int(np.floor((point[2] - self._origin[2]) / self._cell_size))
+        grid = self._footprint_grids.get(slab)
+        if grid is None:
+            grid = self._footprint_grids[slab] = _FootprintGrid(self._footprints(slab))
+        indices = grid.candidates(point)
+        if max_distance is not None:
+            distances = np.linalg.norm(self._positions[indices] - point, axis=1)
+            indices = indices[distances <= max_distance]
+
+        # pyrr stores matrices transposed, so points are row vectors
+        clip = np.append(point, 1.0) @ self._matrices[indices]
+        w = clip[:, 3]
+        inside = (w > 0) & np.all(np.abs(clip[:, :3]) <= w[:, None], axis=1)
+        return np.sort(indices[inside])
+
+    def _footprints(self, slab: int) -> np.ndarray:
+        """The bounding boxes (x0, y0, x1, y1) of the frusta within a horizontal slab.
+
+        The frusta are clipped to the slab, so the boxes hold the frustum corners within
+        the slab and the points where the frustum edges cross its planes. The boxes of
+        frusta that do not reach the slab are NaN.
+        """
+        if self._corners is None:
+            corners = _CLIP_CORNERS @ np.linalg.inv(self._matrices)
+            self._corners = corners[..., :3] / corners[..., 3:]
+        z0 = self._origin[2] + slab * self._cell_size
+        z1 = z0 + self._cell_size
+
+        x, y, z = np.moveaxis(self._corners, -1, 0)
+        inside = (z >= z0) & (z <= z1)
+        xs, ys = [np.where(inside, x, np.nan)], [np.where(inside, y, np.nan)]
+        a, b = _CLIP_EDGES.T
+        for plane in (z0, z1):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = (plane - z[:, a]) / (z[:, b] - z[:, a])
+                t[~((t >= 0.0) & (t <= 1.0))] = np.nan  # the edge misses the plane
+            xs.append(x[:, a] + t * (x[:, b] - x[:, a]))
+            ys.append(y[:, a] + t * (y[:, b] - y[:, a]))
+        xs, ys = np.concatenate(xs, axis=1), np.concatenate(ys, axis=1)
+        # fmin and fmax skip the missing points, boxes without points are NaN
+        return np.stack(
+            [
+                np.fmin.reduce(xs, axis=1),
+                np.fmin.reduce(ys, axis=1),
+                np.fmax.reduce(xs, axis=1),
+                np.fmax.reduce(ys, axis=1),
+            ],
+            axis=1,
+        )
+
+    def seeing(self, point, max_distance: float = None) -> List[Shot]:
+        """All shots whose frustum contains the point.
+
+        See ``seeing_indices`` for the arguments.
+        """
+        return [self._shots[i] for i in self.seeing_indices(point, max_distance)]
@@ -0,0 +1,179 @@
+from alfr.globals import ContextManager
+from alfr.shot import Shot, ShotMatrices, TEXTURE_FORMATS
+from alfr.residency import TextureResidency
+from typing import Callable, List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import moderngl
+
+
+class PackedShots:
+    """The shots of a light field packed into 2D texture arrays.
+
+    All shot images are copied into ``sampler2DArray`` textures and the projection-view
+    matrices of all shots are stored in ``ShotMatrices`` (one row per array layer).
+    This allows the renderer to integrate the whole light field in a single draw call.
+    If there are more shots than the driver supports array layers, the shots are split
+    into several packs which are integrated with one draw call each.
+    The texture arrays use the channels and depth of the shot textures, but are stored
+    uncompressed, since moderngl cannot create compressed texture arrays.
+    """
+
+    def __init__(
+        self,
+        shots: List[Shot],
+        ctx: "moderngl.Context" = None,
+        max_layers: int = None,
+        mipmaps: bool = None,
+        release_textures: bool = False,
+        residency: TextureResidency = None,
+    ):
+        """Pack the given shots.
+
+        Args:
+            shots (List[Shot]): the shots to pack; all shot textures must have the same size,
+                components and dtype
+            ctx (moderngl.Context): the OpenGL context to create the textures with, by
+                default the default context
+            max_layers (int): maximum number of layers per texture array, defaults to the
+                driver limit (GL_MAX_ARRAY_TEXTURE_LAYERS)
+            mipmaps (bool): build mipmaps for the texture arrays, by default if the shots
+                have mipmaps
+            release_textures (bool): release the resident shot textures once they are
+                copied into the texture arrays, such that every image is stored only once
+                on the GPU; the shots upload their texture again if they are rendered on
+                their own
+            residency (TextureResidency): the residency managing the shot textures, which
+                then releases them, such that its accounting stays correct
+        """
+        if len(shots) == 0:
+            raise ValueError("Cannot pack an empty list of shots!")
+
+        formats = {TEXTURE_FORMATS[shot.texture_format][:2] for shot in shots}
+        if len(formats) != 1:
+            raise ValueError(
+                "All shots must have the same texture components and dtype to be packed!"
+            )
+        components, dtype = formats.pop()
+
+        if len(set(map(id, shots))) != len(shots):
+            raise ValueError("Cannot pack the same shot more than once!")
+
+        if ctx is None:
+            ctx = ContextManager.get_default_context()
+        if max_layers is None:
+            max_layers = ctx.info["GL_MAX_ARRAY_TEXTURE_LAYERS"]
+
+        if mipmaps is None:
+            mipmaps = all(shot.mipmaps for shot in shots)
+
+        self._ctx = ctx
+        self._mipmaps = mipmaps
+        self._shots = list(shots)
+        self._packs = []
+
+        release = None
+        if release_textures:
+            release = Shot.release_texture if residency is None else residency.evict
+
+        size = self._layer_size(shots[0])
+        staging = []  # buffer for copying resident shot textures, created on demand
+        try:
+            for start in range(0, len(shots), max_layers):
+                chunk = shots[start : start + max_layers]
+                array = self._pack(chunk, size, components, dtype, staging, release)
+                self._packs.append((array, ShotMatrices(chunk, ctx=ctx), len(chunk)))
+        except Exception:
+            self.release()
+            raise
+        finally:
+            for buffer in staging:
+                buffer.release()
+
+    def _pack(
+        self,
+        shots: List[Shot],
+        size: tuple,
+        components: int,
+        dtype: str,
+        staging: list,
+        release: Callable[[Shot], None] = None,
+    ) -> "moderngl.TextureArray":
+        """Copy the images of the shots into the layers of a new texture array.
+
+        The decoded images are written into the layers directly. Resident shot textures
+        are copied on the GPU instead and handed to ``release`` afterwards, if it is given.
+        """
+        array = self._ctx.texture_array((*size, len(shots)), components, dtype=dtype)
+        try:
+            if components == 1:
+                array.swizzle = "RRR1"  # sample single channel images as gray
+            for layer, shot in enumerate(shots):
+                if shot.resident:
+                    layer_size = shot.texture.size
+                else:
+                    img = shot.read_image()
+                    layer_size = img.shape[1::-1]
+                if layer_size != size:
+                    raise ValueError(
+                        f"All shots must have the same texture size to be packed "
+                        f"({layer_size} != {size})!"
+                    )
+                viewport = (0, 0, layer, *size, 1)
+                if shot.resident:
+                    if not staging:
+                        # moderngl dtypes end with the number of bytes per component
+                        nbytes = size[0] * size[1] * components * int(dtype[-1])
+                        staging.append(self._ctx.buffer(reserve=nbytes))
+                    shot.texture.read_into(staging[0])
+                    array.write(staging[0], viewport=viewport)
+                    if release is not None:
+                        release(shot)
+                else:
+                    array.write(img, viewport=viewport)
+            if self._mipmaps:
+                array.build_mipmaps()
+        except Exception:
+            array.release()
+            raise
+        return array
+
+    @staticmethod
+    def _layer_size(shot: Shot) -> tuple:
+        """The texture size of a shot, from its texture or its (decoded) image."""
+        if shot.resident:
+            return shot.texture.size
+        return shot.read_image().shape[1::-1]
+
+    def update_matrices(self, shots: List[Shot] = None):
+        """Upload the projection-view matrices of the given shots (default: all shots) again.
+
+        Poses changed through the setters of the shots are uploaded before the next draw
+        without this call; it is only needed after modifying a position or rotation in
+        place.
+        """
+        shots = self._shots if shots is None else shots
+        for _, matrices, _ in self._packs:
+            matrices.update([shot for shot in shots if matrices.contains(shot)])
+
+    @property
+    def shots(self) -> List[Shot]:
+        """The packed shots."""
+        return self._shots
+
+    @property
+    def mipmaps(self) -> bool:
+        """Whether the texture arrays have mipmaps."""
+        return self._mipmaps
+
+    @property
+    def packs(self) -> list:
+        """List of (texture array, shot matrices, number of layers) tuples."""
+        return self._packs
+
+    def release(self):
+        """Release the GPU resources of the packed shots."""
+        for array, matrices, _ in self._packs:
+            array.release()
+            matrices.release()
+        self._packs = []
@@ -0,0 +1,242 @@
+import multiprocessing
+import numpy as np
+import queue
+from alfr.camera import Camera
+from typing import Callable, Iterable, Iterator, List
+
+# how often (in seconds) waiting for results checks whether the workers are alive
+_POLL_INTERVAL = 1.0
+
+
+def _create_worker_context():
+    """Create a headless context for a worker, preferring EGL."""
+    import moderngl
+
+    try:
+        return moderngl.create_standalone_context(backend="egl")
+    except Exception:
+        return moderngl.create_standalone_context()
+
+
+def _render_worker(
+    loader, loader_args, loader_kwargs, settings, slot_names, requests, results
+):
+    """Main loop of a worker process: load the shots, then render requests."""
+    from multiprocessing.shared_memory import SharedMemory
+    from alfr.globals import ContextManager
+    from alfr.renderer import Renderer
+
+    slots = [SharedMemory(name=name) for name in slot_names]
+    resolution, channels, dtype = settings
+    shape = (resolution[1], resolution[0], len(channels))
+    try:
+        # everything in this process uses the worker's context
+        ctx = ContextManager.ctx = _create_worker_context()
+        renderer = Renderer(resolution, ctx=ctx)
+        shots = loader(*loader_args, ctx=ctx, **loader_kwargs)
+    except Exception as e:
+        results.put((None, None, e))
+        return
+    results.put((None, None, None))  # ready
+
+    for request in iter(requests.get, None):
+        index, slot, vcam, focus = request
+        out = np.ndarray(shape, dtype=dtype, buffer=slots[slot].buf)
+        try:
+            renderer.integrate(
+                shots, vcam, focus, resolution, out=out, channels=channels
+            )
+            results.put((index, slot, None))
+        except Exception as e:
+            results.put((index, slot, e))
+        del out  # the shared memory cannot be closed while arrays use it
+
+    for shm in slots:
+        shm.close()
+
+
+class RenderPool:
+    """Pool of worker processes integrating shots for many virtual cameras concurrently.
+
+    Every worker creates its own headless OpenGL context (EGL if available), loads its
+    own copy of the shots and takes render requests from a shared queue. The integrals
+    are written into shared memory slots, so only the camera and a slot index are sent
+    between the processes. Shared memory requires Python 3.8 or later. If a worker
+    dies, e.g., because its OpenGL driver crashed, waiting for results raises a
+    ``RuntimeError`` instead of blocking forever.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[..., List],
+        loader_args: tuple = (),
+        loader_kwargs: dict = None,
+        processes: int = None,
+        resolution: tuple = (512, 512),
+        channels: str = "BGRA",
+        dtype: str = "f4",
+        start_method: str = "spawn",
+    ):
+        """Start the workers and let them load the shots.
+
+        Args:
+            loader (Callable): picklable function returning the shots, called in every
+                worker as ``loader(*loader_args, ctx=ctx, **loader_kwargs)``, e.g.,
+                ``load_shots_from_json``
+            loader_args (tuple): positional arguments of the loader
+            loader_kwargs (dict): keyword arguments of the loader
+            processes (int): the number of workers, by default one per core
+            resolution (tuple): the resolution of the integrals
+            channels (str): the channel order of the integrals, see ``Renderer.integrate``
+            dtype (str): the dtype of the integrals
+            start_method (str): the multiprocessing start method; "spawn" keeps an
+                OpenGL context of this process out of the workers
+        """
+        # imported here, such that alfr can be imported before Python 3.8
+        from multiprocessing.shared_memory import SharedMemory
+
+        processes = processes or multiprocessing.cpu_count()
+        self._shape = (resolution[1], resolution[0], len(channels))
+        self._dtype = np.dtype(dtype)
+        nbytes = int(np.prod(self._shape)) * self._dtype.itemsize
+
+        # two slots per worker, so every worker has a request queued while rendering
+        self._slots = [
+            SharedMemory(create=True, size=nbytes) for _ in range(2 * processes)
+        ]
+        self._free_slots = list(range(len(self._slots)))
+
+        mp = multiprocessing.get_context(start_method)
+        self._requests = mp.Queue()
+        self._results = mp.Queue()
+        self._workers = [
+            mp.Process(
+                target=_render_worker,
+                args=(
+                    loader,
+                    tuple(loader_args),
+                    dict(loader_kwargs or {}),
+                    (tuple(resolution), channels, dtype),
+                    [shm.name for shm in self._slots],
+                    self._requests,
+                    self._results,
+                ),
+                daemon=True,
+            )
+            for _ in range(processes)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        # wait until all workers have loaded the shots
+        for _ in self._workers:
+            try:
+                _, _, error = self._get_result()
+            except RuntimeError:
+                self.close()
+                raise
+            if error is not None:
+                self.close()
+                raise RuntimeError("A render worker failed to start!") from error
+
+    @property
+    def processes(self) -> int:
+        """The number of worker processes."""
+        return len(self._workers)
+
+    def integrate(self, vcam: Camera, focus=None) -> np.ndarray:
+        """Integrate the shots for one virtual camera, see ``Renderer.integrate``."""
+        return next(self.map([vcam], focus))
+
+    def map(self, cameras: Iterable[Camera], focus=None) -> Iterator[np.ndarray]:
+        """Integrate the shots for many virtual cameras concurrently.
+
+        Args:
+            cameras (Iterable[Camera]): the virtual cameras
+            focus (float): the distance of the focal plane or a (distance, normal) tuple,
+                see focal_plane_matrix
+
+        Yields:
+            np.ndarray: the integrals in the order of the cameras
+        """
+        self._check_workers()
+        cameras = iter(cameras)
+        submitted = 0
+        next_index = 0
+        finished = {}
+        exhausted = False
+        try:
+            while True:
+                # keep all slots busy
+                while not exhausted and self._free_slots:
+                    vcam = next(cameras, None)
+                    if vcam is None:
+                        exhausted = True
+                        break
+                    slot = self._free_slots.pop()
+                    self._requests.put((submitted, slot, vcam, focus))
+                    submitted += 1
+
+                if next_index == submitted:
+                    return
+
+                while next_index not in finished:
+                    index, slot, error = self._get_result()
+                    if error is None:
+                        # copy the integral out of shared memory to free the slot
+                        finished[index] = np.ndarray(
+                            self._shape, dtype=self._dtype, buffer=self._slots[slot].buf
+                        ).copy()
+                    else:
+                        finished[index] = error
+                    self._free_slots.append(slot)
+
+                result = finished.pop(next_index)
+                next_index += 1
+                if isinstance(result, Exception):
+                    raise result
+                yield result
+        finally:
+            # collect the requests still in flight if the caller stopped early or failed
+            try:
+                for _ in range(submitted - next_index - len(finished)):
+                    _, slot, _ = self._get_result()
+                    self._free_slots.append(slot)
+            except RuntimeError:
+                pass  # a worker died, the requests it took never finish
+
+    def _get_result(self) -> tuple:
+        """Wait for the next result, raising a RuntimeError if a worker has died."""
+        while True:
+            try:
+                return self._results.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                self._check_workers()
+
+    def _check_workers(self):
+        """Raise a RuntimeError if a worker has died."""
+        # workers only exit when the pool is closed
+        for worker in self._workers:
+            if worker.exitcode is not None:
+                raise RuntimeError(
+                    f"A render worker died (exit code {worker.exitcode})!"
+                )
+
+    def close(self):
+        """Stop the workers and free the shared memory."""
+        for worker in self._workers:
+            if worker.is_alive():
+                self._requests.put(None)
+        for worker in self._workers:
+            worker.join()
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+        self._workers = []
+        self._slots = []
+
+    def __enter__(self) -> "RenderPool":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,127 @@
+import numpy as np
+from typing import Callable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import moderngl
+
+
+class PendingReadback:
+    """Handle for an image that is copied from a framebuffer into a pixel pack buffer.
+
+    The copy runs asynchronously on the GPU. ``result`` maps the buffer, which only blocks
+    if the GPU has not finished rendering and copying the image yet.
+    """
+
+    def __init__(
+        self,
+        buffer: "moderngl.Buffer",
+        shape: tuple,
+        dtype: str,
+        postprocess: Callable[[np.ndarray], np.ndarray] = None,
+        out: np.ndarray = None,
+    ):
+        self._buffer = buffer
+        self._shape = shape
+        self._dtype = dtype
+        self._postprocess = postprocess
+        self._out = out
+        self._result = None
+
+    def fetched(self) -> bool:
+        """Whether ``result`` has already copied the image out of the pixel pack buffer.
+
+        This does not tell whether the GPU has finished the transfer; moderngl exposes no
+        fences to query that without blocking.
+        """
+        return self._buffer is None
+
+    def result(self) -> np.ndarray:
+        """Wait for the image and return it.
+
+        Returns:
+            np.ndarray: the (postprocessed) image
+        """
+        if self._buffer is not None:
+            img = self._out
+            if img is None:
+                img = np.empty(self._shape, dtype=self._dtype)
+            self._buffer.read_into(img)
+            self._result = img if self._postprocess is None else self._postprocess(img)
+            self._buffer = None
+            self._out = None
+        return self._result
+
+
+class ReadbackRing:
+    """Ring of pixel pack buffers for non-blocking framebuffer readback.
+
+    Every read goes into the next buffer of the ring, so the readback of frame N overlaps
+    with rendering frame N+1. Before a buffer is reused, the result it still holds is
+    fetched into its handle.
+    """
+
+    def __init__(self, ctx: "moderngl.Context", slots: int = 2):
+        """Create the ring.
+
+        Args:
+            ctx (moderngl.Context): the OpenGL context
+            slots (int): the number of pixel pack buffers (2 for double buffering)
+        """
+        self._ctx = ctx
+        self._buffers = [None] * slots
+        self._pending = [None] * slots
+        self._next = 0
+
+    def read(
+        self,
+        fbo: "moderngl.Framebuffer",
+        components: int = 4,
+        dtype: str = "f1",
+        postprocess: Callable[[np.ndarray], np.ndarray] = None,
+        out: np.ndarray = None,
+    ) -> PendingReadback:
+        """Start reading the framebuffer into the next pixel pack buffer.
+
+        Args:
+            fbo (moderngl.Framebuffer): the framebuffer to read
+            components (int): the number of components to read
+            dtype (str): the moderngl dtype to read ("f1", "f2", "f4", ...)
+            postprocess (Callable): applied to the image when the result is fetched
+            out (np.ndarray): C-contiguous array the image is copied into when the result
+                is fetched, allocated if None
+
+        Returns:
+            PendingReadback: handle for the image
+        """
+        slot = self._next
+        self._next = (self._next + 1) % len(self._buffers)
+
+        if self._pending[slot] is not None:
+            self._pending[slot].result()  # free the buffer before it is overwritten
+
+        np_dtype = "u1" if dtype == "f1" else dtype
+        width, height = fbo.size
+        nbytes = width * height * components * np.dtype(np_dtype).itemsize
+        buffer = self._buffers[slot]
+        if buffer is None or buffer.size != nbytes:
+            if buffer is not None:
+                buffer.release()
+            buffer = self._buffers[slot] = self._ctx.buffer(reserve=nbytes)
+
+        fbo.read_into(buffer, components=components, dtype=dtype)
+        pending = PendingReadback(
+            buffer, (height, width, components), np_dtype, postprocess, out
+        )
+        self._pending[slot] = pending
+        return pending
+
+    def release(self):
+        """Fetch all pending results and release the buffers."""
+        for pending in self._pending:
+            if pending is not None:
+                pending.result()
+        for buffer in self._buffers:
+            if buffer is not None:
+                buffer.release()
+        self._buffers = [None] * len(self._buffers)
+        self._pending = [None] * len(self._pending)
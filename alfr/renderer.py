@@ -1,36 +1,163 @@
 import numpy as np
-import cv2
-import moderngl
 from alfr.globals import ContextManager
-from alfr.shot import Shot
+from alfr.shot import Shot, ShotMatrices
 from alfr.camera import Camera
+from alfr.packed import PackedShots
+from alfr.readback import PendingReadback, ReadbackRing
+from alfr.residency import TextureResidency
+from alfr.shotset import ShotSet
+from alfr.culling import shot_footprints
 from typing import Tuple
 from pyrr import Matrix44, Quaternion, Vector3, vector
-from typing import List
+from typing import Iterable, Iterator, List, Union, TYPE_CHECKING
 
+if TYPE_CHECKING:
+    import moderngl
 
-def plane(size):
+# distance of the focal plane if no focus is given
+DEFAULT_FOCUS = 10.0
+
+# output dtypes the resolve pass can render (numpy dtype -> moderngl dtype)
+RESOLVE_DTYPES = {"u1": "f1", "f2": "f2", "f4": "f4"}
+
+
+def plane(size, depth=-DEFAULT_FOCUS):
     """
-    Create a plane with the given size.
+    Create a plane with the given size at the given depth (z coordinate).
     """
     u = np.repeat(np.linspace(-size, size, 2), 2)
     v = np.tile([-size, size], 2)
-    w = np.ones(4) * -10
+    w = np.ones(4) * depth
     return np.concatenate([np.dstack([u, v, w]), np.dstack([v, u, w])])
 
 
+def focal_plane_matrix(focus=None) -> Matrix44:
+    """Model matrix placing the focal plane.
+
+    The renderer's geometry is a plane through the origin with normal (0, 0, 1). It is
+    moved to the points p with dot(normal, p) = -distance and scaled with the distance,
+    such that it covers the same field of view for every focus.
+
+    Args:
+        focus: the distance of the focal plane (float), or a (distance, normal) tuple to
+            tilt the plane. None uses DEFAULT_FOCUS and the normal (0, 0, 1).
+
+    Returns:
+        Matrix44: the model matrix
+    """
+    if focus is None:
+        focus = DEFAULT_FOCUS
+    if isinstance(focus, (tuple, list)):
+        distance, normal = focus
+        normal = np.asarray(normal, dtype=float)
+        normal = normal / np.linalg.norm(normal)
+    else:
+        distance, normal = focus, np.array([0.0, 0.0, 1.0])
+
+    # rotation taking (0, 0, 1) to the normal (Rodrigues' formula)
+    axis = np.cross([0.0, 0.0, 1.0], normal)
+    sin, cos = np.linalg.norm(axis), normal[2]
+    if sin < 1e-8:
+        rotation = np.diag([1.0, np.sign(cos), np.sign(cos)])
+    else:
+        k = axis / sin
+        K = np.array([[0, -k[2], k[1]], [k[2], 0, -k[0]], [-k[1], k[0], 0]])
+        rotation = np.identity(3) + sin * K + (1 - cos) * K @ K
+
+    scale = abs(distance) / DEFAULT_FOCUS if distance != 0 else 1.0
+    model = np.identity(4)
+    model[:3, :3] = rotation * scale
+    model[:3, 3] = -distance * normal
+    # pyrr stores matrices transposed (column-major in GLSL)
+    return Matrix44(np.ascontiguousarray(model.T))
+
+
+def crop_matrix(x0: float, x1: float, y0: float, y1: float) -> Matrix44:
+    """Matrix mapping the rectangle [x0, x1] x [y0, y1] in normalized device coordinates
+    to [-1, 1] x [-1, 1]. Multiplied with a projection matrix, it gives the off-axis
+    projection of a sub-frustum.
+    """
+    crop = np.identity(4)
+    crop[0, 0] = 2.0 / (x1 - x0)
+    crop[1, 1] = 2.0 / (y1 - y0)
+    crop[3, 0] = -(x1 + x0) / (x1 - x0)  # pyrr stores the translation in the last row
+    crop[3, 1] = -(y1 + y0) / (y1 - y0)
+    return Matrix44(crop)
+
+
+def _path_matrices(cameras: Union[Iterable[Camera], ShotSet]) -> Iterator[tuple]:
+    """The projection, view and projection * view matrices of the cameras of a path.
+
+    The matrices of a ``ShotSet`` are computed with one vectorised call, other cameras
+    provide their cached matrices one by one.
+    """
+    if isinstance(cameras, ShotSet):
+        projections = cameras.projection_matrices()
+        views = cameras.view_matrices()
+        for projection, view in zip(projections, views):
+            # pyrr stores matrices transposed, so A * B in pyrr is B @ A in numpy
+            yield projection.astype("f4"), view.astype("f4"), view @ projection
+    else:
+        for vcam in cameras:
+            yield (
+                vcam.projection_matrix_f4,
+                vcam.view_matrix_f4,
+                vcam.projection_matrix * vcam.view_matrix,
+            )
+
+
+class _CroppedCamera:
+    """A camera seeing only a sub-rectangle of the image of another camera."""
+
+    def __init__(self, camera: Camera, crop: Matrix44):
+        self._camera = camera
+        self._projection_matrix = crop * camera.projection_matrix
+
+    @property
+    def projection_matrix(self) -> Matrix44:
+        return self._projection_matrix
+
+    @property
+    def view_matrix(self) -> Matrix44:
+        return self._camera.view_matrix
+
+    @property
+    def projection_matrix_f4(self) -> np.ndarray:
+        return np.ascontiguousarray(self._projection_matrix, dtype="f4")
+
+    @property
+    def view_matrix_f4(self) -> np.ndarray:
+        return self._camera.view_matrix_f4
+
+
 class Renderer:
     def __init__(
         self,
         resolution: tuple = (512, 512),
-        ctx: moderngl.Context = ContextManager.get_default_context(),
+        ctx: "moderngl.Context" = None,
+        accumulation_dtype: str = "f4",
     ):
+        """Create a renderer.
+
+        Args:
+            resolution (tuple): the default resolution of the rendered images
+            ctx (moderngl.Context): the OpenGL context to render with, by default the
+                default context
+            accumulation_dtype (str): dtype of the render target ``integrate`` accumulates into,
+                either "f4" (float32) or "f2" (float16). The alpha channel counts the
+                contributing shots, which is exact up to 2**24 shots for "f4" and 2048 for "f2".
+        """
 
+        if ctx is None:
+            ctx = ContextManager.get_default_context()
         self._ctx = ctx
         self._program = self._setup_alfr_program(self._ctx)
-        self._fbo = self._ctx.simple_framebuffer(resolution, components=4)
+        self._fbo = self._create_fbo(resolution)
+        self._accumulation_dtype = accumulation_dtype
+        self._accumulation_fbo = self._create_accumulation_fbo(resolution)
 
-        vbo = self._ctx.buffer(plane(100).astype("f4"))
+        # the focal plane is placed by the model matrix, see focal_plane_matrix
+        vbo = self._ctx.buffer(plane(100, depth=0.0).astype("f4"))
         # Indices are given to specify the order of drawing
         indices = np.array([0, 1, 2, 2, 3, 1], dtype="i4")
         ibo = self._ctx.buffer(indices)
@@ -40,32 +167,130 @@ class Renderer:
         ]
         self._vao = self._ctx.vertex_array(self._program, vao_content, ibo)
 
-    def _prepare_projection(self, vcam: Camera, focus=None, resolution: tuple = None):
+        self._shot_matrices = ShotMatrices(ctx=self._ctx)
+
+        self._packed_program = self._setup_packed_program(self._ctx)
+        self._packed_vao = self._ctx.vertex_array(
+            self._packed_program, vao_content, ibo
+        )
+
+        self._focal_stack_program = self._setup_focal_stack_program(self._ctx)
+        self._focal_stack_vao = self._ctx.vertex_array(
+            self._focal_stack_program, vao_content, ibo
+        )
+        self._focal_stack_fbo = None
+        # whether texture arrays can be attached to framebuffers, see integrate_focal_stack
+        self._layered_framebuffers = True
+
+        # double-buffered asynchronous readback
+        self._readback = ReadbackRing(self._ctx, slots=2)
+
+        # arrays reused by every readback, see _scratch
+        self._scratch_arrays = {}
+
+        # fullscreen pass converting rendered images into the output format
+        self._resolve_program = self._setup_resolve_program(self._ctx)
+        self._resolve_vao = self._ctx.vertex_array(self._resolve_program, [])
+        self._resolve_fbos = {}
+
+        self._culling = True
+        self._residency = None
+
+        # samplers for shot textures with and without mipmaps
+        self._mipmap_sampler = self._ctx.sampler(
+            filter=(self._ctx.LINEAR_MIPMAP_LINEAR, self._ctx.LINEAR)
+        )
+        self._linear_sampler = self._ctx.sampler(
+            filter=(self._ctx.LINEAR, self._ctx.LINEAR)
+        )
+
+    def _create_fbo(self, resolution: tuple) -> "moderngl.Framebuffer":
+        """Create an 8 bit RGBA framebuffer with depth buffer for projecting shots."""
+        return self._ctx.framebuffer(
+            color_attachments=[self._ctx.texture(resolution, 4)],
+            depth_attachment=self._ctx.depth_renderbuffer(resolution),
+        )
+
+    def _create_accumulation_fbo(self, resolution: tuple) -> "moderngl.Framebuffer":
+        """Create a floating point framebuffer used for integrating shots on the GPU."""
+        color = self._ctx.texture(resolution, 4, dtype=self._accumulation_dtype)
+        return self._ctx.framebuffer(color_attachments=[color])
+
+    @staticmethod
+    def _release_framebuffer(fbo: "moderngl.Framebuffer"):
+        """Release a framebuffer created by the renderer together with its attachments."""
+        for attachment in fbo.color_attachments:
+            attachment.release()
+        if fbo.depth_attachment is not None:
+            fbo.depth_attachment.release()
+        fbo.release()
+
+    def _prepare_projection(
+        self,
+        vcam: Camera,
+        focus=None,
+        resolution: tuple = None,
+        accumulate=False,
+        program: "moderngl.Program" = None,
+    ):
         """Prepare the renderer for projection a shot.
 
         Activate the framebuffer, clear it and set the matrices for the shader program.
 
         Args:
             vcam (Camera): the virtual camera
-            focus (float): the focus object
+            focus (float): the distance of the focal plane or a (distance, normal) tuple,
+                see focal_plane_matrix
             resolution (tuple): the resolution of the image
+            accumulate (bool): render into the floating point accumulation framebuffer
+                with additive blending instead of the default framebuffer
+            program (moderngl.Program): the shader program to set the matrices for,
+                defaults to the program used for projecting single shots
 
         """
 
-        if resolution is not None and resolution != self._fbo.size:
-            self.fbo = self._ctx.simple_framebuffer(resolution, components=4)
-        self.fbo.use()
+        self._resize_targets(resolution, accumulate)
+        if accumulate:
+            self._begin_accumulation(self._accumulation_fbo)
+        else:
+            self.fbo.use()
+            self._ctx.clear(0.0, 0.0, 0.0)
+            self._ctx.disable(self._ctx.BLEND)
+            self._ctx.enable(self._ctx.DEPTH_TEST)
 
-        self._ctx.clear(0.0, 0.0, 0.0)
-        self._ctx.enable(moderngl.DEPTH_TEST)
+        if program is None:
+            program = self._program
+        modelMat = program["m_model"]
+        viewMat = program["m_cam"]
+        projMat = program["m_proj"]
+
+        projMat.write(vcam.projection_matrix_f4)
+        viewMat.write(vcam.view_matrix_f4)
+        modelMat.write(focal_plane_matrix(focus).astype("f4"))
+
+        if program is self._program:
+            self._shot_matrices.texture.use(1)
+            program["shotTexture"].value = 0
+            program["shotMatrices"].value = 1
 
-        modelMat = self._program["m_model"]
-        viewMat = self._program["m_cam"]
-        projMat = self._program["m_proj"]
+    def _resize_targets(self, resolution: tuple = None, accumulate=False):
+        """Recreate the framebuffer and the accumulation framebuffer for a resolution."""
+        if resolution is not None and resolution != self._fbo.size:
+            self._release_framebuffer(self._fbo)
+            self.fbo = self._create_fbo(resolution)
+
+        if accumulate and self._accumulation_fbo.size != self.fbo.size:
+            self._release_framebuffer(self._accumulation_fbo)
+            self._accumulation_fbo = self._create_accumulation_fbo(self.fbo.size)
 
-        projMat.write(vcam.projection_matrix.astype("f4"))
-        viewMat.write(vcam.view_matrix.astype("f4"))
-        modelMat.write((Matrix44.identity()).astype("f4"))  # Todo!
+    def _begin_accumulation(self, fbo: "moderngl.Framebuffer"):
+        """Activate and clear a floating point framebuffer and enable additive blending."""
+        fbo.use()
+        self._ctx.clear(0.0, 0.0, 0.0, 0.0)
+        self._ctx.disable(self._ctx.DEPTH_TEST)
+        self._ctx.enable(self._ctx.BLEND)
+        self._ctx.blend_equation = self._ctx.FUNC_ADD
+        self._ctx.blend_func = self._ctx.ADDITIVE_BLENDING
 
     def _img_from_fbo(self) -> np.ndarray:
         """Get the image from the framebuffer.
@@ -78,46 +303,217 @@ class Renderer:
         raw = self.fbo.read(components=4, dtype="f1")
         return np.frombuffer(raw, dtype="uint8").reshape((*self.fbo.size[1::-1], 4))
 
-    def _postpro_img(self, img: np.ndarray) -> np.ndarray:
-        """Postprocess an image such that it is compatible with opencv
+    def _scratch(self, name: str, shape: tuple, dtype: str) -> np.ndarray:
+        """Get an array that is only reallocated if its shape or dtype changes."""
+        arr = self._scratch_arrays.get(name)
+        if arr is None or arr.shape != shape or arr.dtype != np.dtype(dtype):
+            arr = self._scratch_arrays[name] = np.empty(shape, dtype=dtype)
+        return arr
+
+    def _convert_img(
+        self,
+        raw: np.ndarray,
+        out: np.ndarray = None,
+        channels: str = "BGRA",
+        dtype: str = "u1",
+        normalize: bool = False,
+    ) -> np.ndarray:
+        """Convert RGBA images read from OpenGL into the requested output format on the CPU.
+
+        The images are flipped vertically and their channels are reordered. Pixel values
+        range from 0 to 255 for all dtypes. This is the fallback of ``_read`` for formats
+        the resolve pass does not support.
 
         Args:
-            img (np.ndarray): the image to process
+            raw (np.ndarray): the images as read from OpenGL, with shape (..., H, W, 4)
+            out (np.ndarray): array to write the result into, allocated if None
+            channels (str): the channel order of the result, e.g., "BGRA", "BGR" or "RGB"
+            dtype (str): the dtype of the result ("u1", "f2", "f4", ...), ignored if
+                ``out`` is given
+            normalize (bool): divide the colors by the alpha channel, which holds the
+                accumulated number of shots
 
         Returns:
-            np.ndarray: processed image
+            np.ndarray: the converted images
         """
-        # img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)  # convert to RGB, opencv uses BGR
-        img = np.flip(img, 0).copy(order="C")  # flip image vertically
-        # flip red and blue channels; cvtColor removes alpha channel so do it manually!
-        tmp = img[:, :, 0].copy()
-        img[:, :, 0] = img[:, :, 2].copy()
-        img[:, :, 2] = tmp
-        return img
+        if len(channels) == 0 or any(c not in "RGBA" for c in channels):
+            raise ValueError(f"Invalid channels {channels}, use letters of 'RGBA'!")
+
+        shape = (*raw.shape[:-1], len(channels))
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        elif out.shape != shape:
+            raise ValueError(f"Output array has shape {out.shape} instead of {shape}!")
+
+        src = raw[..., ::-1, :, :]  # flip image vertically
+        to_int = np.issubdtype(out.dtype, np.integer)
+        if normalize or (to_int and not np.issubdtype(raw.dtype, np.integer)):
+            tmp = self._scratch("convert", raw.shape, "f4")
+            if normalize:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    np.divide(src, src[..., 3:4], out=tmp)
+                tmp *= 255.0
+                np.fmax(tmp, 0.0, out=tmp)  # uncovered pixels (0 / 0) become 0
+            else:
+                np.copyto(tmp, src)
+            if to_int:
+                np.rint(tmp, out=tmp)
+            src = tmp
+
+        for i, c in enumerate(channels):
+            np.copyto(out[..., i], src[..., "RGBA".index(c)], casting="unsafe")
+        return out
+
+    def _resolve_pass(
+        self,
+        source,
+        channels: str,
+        dtype: str,
+        normalize: bool,
+        layer: int = None,
+    ) -> "moderngl.Framebuffer":
+        """Convert a rendered image into the output format in a fullscreen pass on the GPU.
+
+        The image is flipped vertically, its colors are normalized by the number of shots
+        in the alpha channel and its channels are reordered. Uncovered pixels are 0 in
+        all channels.
+
+        Args:
+            source (moderngl.Texture | moderngl.TextureArray): the rendered image(s)
+            channels (str): the channel order of the result
+            dtype (str): the numpy dtype of the result, one of RESOLVE_DTYPES
+            normalize (bool): divide the colors by the alpha channel
+            layer (int): the layer to resolve if the source is a texture array
+
+        Returns:
+            moderngl.Framebuffer: the framebuffer holding the result in its first components
+        """
+        gl_dtype = RESOLVE_DTYPES[dtype]
+        size = source.size[:2]
+        # one target per dtype, replaced when the size of the images changes
+        fbo = self._resolve_fbos.get(gl_dtype)
+        if fbo is None or fbo.size != size:
+            if fbo is not None:
+                self._release_framebuffer(fbo)
+            texture = self._ctx.texture(size, 4, dtype=gl_dtype)
+            fbo = self._resolve_fbos[gl_dtype] = self._ctx.framebuffer(
+                color_attachments=[texture]
+            )
+
+        program = self._resolve_program
+        program["layered"].value = layer is not None
+        program["layer"].value = 0 if layer is None else layer
+        program["source"].value = 0
+        program["sourceLayers"].value = 1
+        program["normalize"].value = normalize
+        # unsigned normalized targets store 0..1, float targets 0..255
+        program["scale"].value = 1.0 if gl_dtype == "f1" else 255.0
+        swizzle = ["RGBA".index(c) for c in channels] + [3] * (4 - len(channels))
+        program["swizzle"].value = tuple(swizzle)
+
+        # a mipmap sampler would make the source incomplete
+        self._ctx.clear_samplers(0, 2)
+        source.use(0 if layer is None else 1)
+        fbo.use()
+        self._ctx.disable(self._ctx.BLEND)
+        self._ctx.disable(self._ctx.DEPTH_TEST)
+        self._resolve_vao.render(self._ctx.TRIANGLES, vertices=3)
+        return fbo
+
+    def _read(
+        self,
+        source,
+        out: np.ndarray = None,
+        channels: str = "BGRA",
+        dtype: str = "u1",
+        normalize: bool = False,
+        layers: int = None,
+    ) -> np.ndarray:
+        """Read rendered images in the requested output format.
+
+        Supported formats are converted by the resolve pass, so reading is a single copy
+        into the output array. Other formats are converted on the CPU.
+
+        Args:
+            source (moderngl.Texture | moderngl.TextureArray): the rendered image(s)
+            out (np.ndarray): array to write the result into, allocated if None
+            channels (str): the channel order of the result, e.g., "BGRA", "BGR" or "RGB"
+            dtype (str): the dtype of the result, ignored if ``out`` is given
+            normalize (bool): divide the colors by the alpha channel, which holds the
+                accumulated number of shots
+            layers (int): the number of layers if the source is a texture array
+
+        Returns:
+            np.ndarray: the images with shape (H, W, C) or (layers, H, W, C)
+        """
+        if len(channels) == 0 or any(c not in "RGBA" for c in channels):
+            raise ValueError(f"Invalid channels {channels}, use letters of 'RGBA'!")
+        dtype = np.dtype(dtype if out is None else out.dtype).str[1:]
+
+        width, height = source.size[:2]
+        shape = (height, width, len(channels))
+        if layers is not None:
+            shape = (layers, *shape)
+
+        if dtype not in RESOLVE_DTYPES:
+            raw = self._scratch(
+                "raw", (*shape[:-1], 4), "u1" if source.dtype == "f1" else source.dtype
+            )
+            source.read_into(raw)
+            return self._convert_img(raw, out, channels, dtype, normalize)
+
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        elif out.shape != shape:
+            raise ValueError(f"Output array has shape {out.shape} instead of {shape}!")
+        target = out if out.flags.c_contiguous else self._scratch("out", shape, dtype)
+
+        for layer in [None] if layers is None else range(layers):
+            fbo = self._resolve_pass(source, channels, dtype, normalize, layer)
+            fbo.read_into(
+                target if layer is None else target[layer],
+                components=len(channels),
+                dtype=RESOLVE_DTYPES[dtype],
+            )
+
+        if target is not out:
+            np.copyto(out, target)
+        return out
 
     def project_shot(
-        self, shot: Shot, vcam: Camera, focus=None, resolution=None
+        self,
+        shot: Shot,
+        vcam: Camera,
+        focus=None,
+        resolution=None,
+        out: np.ndarray = None,
+        channels: str = "BGRA",
+        dtype: str = "u1",
     ) -> np.ndarray:
         """Project the given camera into a given shot.
 
         Args:
             shot (Shot): the shot to project
             vcam (Camera): the virtual camera
-            focus (float): the focus object
+            focus (float): the distance of the focal plane or a (distance, normal) tuple,
+                see focal_plane_matrix
             resolution (tuple): the resolution of the image
+            out (np.ndarray): preallocated array of shape (H, W, len(channels)) to write to
+            channels (str): the channel order of the image, e.g., "BGRA", "BGR" or "RGB"
+            dtype (str): the dtype of the image, ignored if ``out`` is given
 
         Returns:
             np.ndarray: the projected image
         """
 
+        self._shot_matrices.add([shot])
         self._prepare_projection(vcam, focus, resolution)
 
         self._ctx.clear(0.0, 0.0, 0.0)
         shot.use(self)
-        self._vao.render(moderngl.TRIANGLES)
+        self._vao.render(self._ctx.TRIANGLES)
 
-        img = self._img_from_fbo()
-        return self._postpro_img(img)
+        return self._read(self.fbo.color_attachments[0], out, channels, dtype)
 
     def project_multiple_shots(
         self,
@@ -132,7 +528,8 @@ class Renderer:
         Args:
             shots (List[Shot]): the shots to project
             vcam (Camera): the virtual camera
-            focus (float): the focus object
+            focus (float): the distance of the focal plane or a (distance, normal) tuple,
+                see focal_plane_matrix
             resolution (tuple): the resolution of the image
             postprocess (bool): whether to postprocess the image
 
@@ -140,41 +537,549 @@ class Renderer:
             List[np.ndarray]: the projected images
         """
         projections = []
+        self._shot_matrices.add(shots)
         self._prepare_projection(vcam, focus, resolution)
 
         for shot in shots:
             self._ctx.clear(0.0, 0.0, 0.0)
             shot.use(self)
-            self._vao.render(moderngl.TRIANGLES)
+            self._vao.render(self._ctx.TRIANGLES)
 
-            img = self._img_from_fbo()
-            projections.append(self._postpro_img(img) if postprocess else img)
+            if postprocess:
+                img = self._read(self.fbo.color_attachments[0])
+                self.fbo.use()
+            else:
+                img = self._img_from_fbo()
+            projections.append(img)
 
         return projections
 
     def integrate(
-        self, shots: List[Shot], vcam: Camera, focus=None, resolution: tuple = None
+        self,
+        shots: List[Shot],
+        vcam: Camera,
+        focus=None,
+        resolution: tuple = None,
+        on_gpu: bool = True,
+        out: np.ndarray = None,
+        channels: str = "BGRA",
+        dtype: str = "f4",
     ) -> np.ndarray:
         """Integrate multiple shots into a single image.
 
         Args:
             shots (List[Shot]): the shots to integrate
             vcam (Camera): the virtual camera
-            focus (float): the focus object
+            focus (float): the distance of the focal plane or a (distance, normal) tuple,
+                see focal_plane_matrix
             resolution (tuple): the resolution of the image
+            on_gpu (bool): accumulate all shots on the GPU with additive blending and read
+                back the integral once. If False, every shot is read back and summed on the CPU.
+            out (np.ndarray): preallocated array of shape (H, W, len(channels)) to write to
+            channels (str): the channel order of the image, e.g., "BGRA", "BGR" or "RGB"
+            dtype (str): the dtype of the image, ignored if ``out`` is given
 
         Returns:
             np.ndarray: the integrated image
         """
-        projections = self.project_multiple_shots(
-            shots, vcam, focus, resolution, postprocess=False
+        if not on_gpu:
+            projections = self.project_multiple_shots(
+                shots, vcam, focus, resolution, postprocess=False
+            )
+            integral = np.stack(projections, axis=-1).sum(axis=-1)
+            # postprocess only once!
+            return self._convert_img(integral, out, channels, dtype, normalize=True)
+
+        self._accumulate_shots(shots, vcam, focus, resolution)
+        return self._read(
+            self._accumulation_fbo.color_attachments[0],
+            out,
+            channels,
+            dtype,
+            normalize=True,
+        )
+
+    def integrate_async(
+        self,
+        shots: List[Shot],
+        vcam: Camera,
+        focus=None,
+        resolution: tuple = None,
+        out: np.ndarray = None,
+        channels: str = "BGRA",
+        dtype: str = "f4",
+    ) -> PendingReadback:
+        """Integrate multiple shots into a single image without waiting for the result.
+
+        The integral is copied into a ring of pixel pack buffers, so the readback overlaps
+        with rendering the next frames. Call ``result()`` on the returned handle to get the
+        image; it is the same image ``integrate`` returns.
+
+        Args:
+            shots (List[Shot]): the shots to integrate
+            vcam (Camera): the virtual camera
+            focus (float): the distance of the focal plane or a (distance, normal) tuple,
+                see focal_plane_matrix
+            resolution (tuple): the resolution of the image
+            out (np.ndarray): preallocated array of shape (H, W, len(channels)) to write to
+            channels (str): the channel order of the image, e.g., "BGRA", "BGR" or "RGB"
+            dtype (str): the dtype of the image, ignored if ``out`` is given
+
+        Returns:
+            PendingReadback: handle for the integrated image
+        """
+        self._accumulate_shots(shots, vcam, focus, resolution)
+        return self._read_async(out, channels, dtype)
+
+    def _read_async(
+        self, out: np.ndarray, channels: str, dtype: str
+    ) -> PendingReadback:
+        """Start reading the normalized integral back through the readback ring."""
+        if len(channels) == 0 or any(c not in "RGBA" for c in channels):
+            raise ValueError(f"Invalid channels {channels}, use letters of 'RGBA'!")
+        dtype = np.dtype(dtype if out is None else out.dtype).str[1:]
+
+        if dtype not in RESOLVE_DTYPES or (
+            out is not None and not out.flags.c_contiguous
+        ):
+            return self._readback.read(
+                self._accumulation_fbo,
+                components=4,
+                dtype="f4",
+                postprocess=lambda raw: self._convert_img(
+                    raw, out, channels, dtype, normalize=True
+                ),
+            )
+
+        fbo = self._resolve_pass(
+            self._accumulation_fbo.color_attachments[0], channels, dtype, True
+        )
+        return self._readback.read(
+            fbo, components=len(channels), dtype=RESOLVE_DTYPES[dtype], out=out
         )
 
-        integral = np.stack(projections, axis=-1).sum(axis=-1)
-        integral = self._postpro_img(integral)  # postprocess only once!
-        alpha = integral[:, :, -1] / 255.0
-        integral = np.divide(integral, alpha[:, :, np.newaxis])
-        return integral
+    def _accumulate_shots(
+        self, shots: List[Shot], vcam: Camera, focus=None, resolution: tuple = None
+    ):
+        """Render all shots additively into the accumulation framebuffer."""
+        self._shot_matrices.add(shots)
+        self._prepare_projection(vcam, focus, resolution, accumulate=True)
+        self._draw_shots(
+            shots,
+            [self._shot_matrices.row(shot) for shot in shots],
+            self._shot_matrices.matrices(shots),
+            focal_plane_matrix(focus),
+            vcam.projection_matrix * vcam.view_matrix,
+        )
+
+    def _draw_shots(
+        self,
+        shots: List[Shot],
+        rows: List[int],
+        matrices: np.ndarray,
+        model: Matrix44,
+        vcam_matrix: Matrix44,
+    ):
+        """Draw the shots into the prepared accumulation framebuffer.
+
+        Shots whose footprint on the focal plane is not seen by the virtual camera are
+        skipped and the others are scissored to their footprint, see ``culling``.
+
+        Args:
+            shots (List[Shot]): the shots
+            rows (List[int]): the rows of the shots in ``shot_matrices``
+            matrices (np.ndarray): the projection * view matrices of the shots
+            model (Matrix44): the model matrix of the focal plane
+            vcam_matrix (Matrix44): projection * view matrix of the virtual camera
+        """
+        if self._culling:
+            visible, boxes = shot_footprints(
+                matrices, model, vcam_matrix, self._accumulation_fbo.size
+            )
+        self._shot_matrices.texture.use(1)
+        shot_index = self._program["shot_index"]
+        bound = None
+        for i, shot in enumerate(shots):
+            if self._culling:
+                if not visible[i]:
+                    continue
+                self._ctx.scissor = tuple(boxes[i].tolist())
+            self.shot_texture(shot).use(0)
+            sampler = self.shot_sampler(shot.mipmaps)
+            if sampler is not bound:
+                sampler.use(0)
+                bound = sampler
+            shot_index.value = rows[i]
+            self._vao.render(self._ctx.TRIANGLES)
+        self._ctx.scissor = None
+        self._ctx.disable(self._ctx.BLEND)
+
+    def integrate_packed(
+        self,
+        packed: PackedShots,
+        vcam: Camera,
+        focus=None,
+        resolution: tuple = None,
+        out: np.ndarray = None,
+        channels: str = "BGRA",
+        dtype: str = "f4",
+    ) -> np.ndarray:
+        """Integrate packed shots into a single image with one draw call per texture array.
+
+        Args:
+            packed (PackedShots): the shots to integrate, see ``Renderer.pack``
+            vcam (Camera): the virtual camera
+            focus (float): the distance of the focal plane or a (distance, normal) tuple,
+                see focal_plane_matrix
+            resolution (tuple): the resolution of the image
+            out (np.ndarray): preallocated array of shape (H, W, len(channels)) to write to
+            channels (str): the channel order of the image, e.g., "BGRA", "BGR" or "RGB"
+            dtype (str): the dtype of the image, ignored if ``out`` is given
+
+        Returns:
+            np.ndarray: the integrated image
+        """
+        self._accumulate_packed(packed, vcam, focus, resolution)
+        return self._read(
+            self._accumulation_fbo.color_attachments[0],
+            out,
+            channels,
+            dtype,
+            normalize=True,
+        )
+
+    def _accumulate_packed(
+        self, packed: PackedShots, vcam: Camera, focus=None, resolution: tuple = None
+    ):
+        """Render packed shots additively into the accumulation framebuffer."""
+        self._prepare_projection(
+            vcam, focus, resolution, accumulate=True, program=self._packed_program
+        )
+        self._packed_program["shotTextures"].value = 0
+        self._packed_program["shotMatrices"].value = 1
+        self._draw_packed(packed)
+
+    def _draw_packed(self, packed: PackedShots):
+        """Draw packed shots into the prepared accumulation framebuffer."""
+        self.shot_sampler(packed.mipmaps).use(0)
+        shot_count = self._packed_program["shot_count"]
+        for array, matrices, count in packed.packs:
+            matrices.sync()
+            array.use(0)
+            matrices.texture.use(1)
+            shot_count.value = count
+            self._packed_vao.render(self._ctx.TRIANGLES)
+        self._ctx.disable(self._ctx.BLEND)
+
+    def integrate_path(
+        self,
+        shots: Union[List[Shot], PackedShots],
+        cameras: Union[Iterable[Camera], ShotSet, np.ndarray],
+        focus=None,
+        resolution: tuple = None,
+        channels: str = "BGRA",
+        dtype: str = "f4",
+        intrinsics: Camera = None,
+    ) -> Iterator[np.ndarray]:
+        """Integrate the shots for every virtual camera of a path, e.g., for a video.
+
+        The frames are pipelined: the readback of a frame overlaps with rendering the next
+        one. The camera matrices of a ``ShotSet`` (or poses) are computed at once and the
+        rows of the shot matrices are looked up once for the whole path. Packed shots are
+        integrated with one draw call per texture array and frame. The frames are yielded
+        one by one, so long paths are never held in memory. The renderer may be used
+        between frames: every frame sets up the framebuffers and the shader state again.
+
+        Args:
+            shots (List[Shot] | PackedShots): the shots to integrate, packed shots are
+                integrated as in ``integrate_packed``
+            cameras (Iterable[Camera] | ShotSet | np.ndarray): the virtual cameras, e.g.,
+                a list, a ``ShotSet`` or an array of poses with shape (N, 7), i.e.,
+                positions and rotations as quaternions (x, y, z, w), see
+                ``ShotSet.from_poses``
+            focus (float): the distance of the focal plane or a (distance, normal) tuple,
+                see focal_plane_matrix
+            resolution (tuple): the resolution of the images, by default the current
+                resolution of the renderer
+            channels (str): the channel order of the images, e.g., "BGRA", "BGR" or "RGB"
+            dtype (str): the dtype of the images
+            intrinsics (Camera): camera whose field of view, aspect ratio and clipping
+                planes are used for an array of poses, defaults to ``Camera()``
+
+        Yields:
+            np.ndarray: the integrated image of every camera, as ``integrate`` returns it
+        """
+        if isinstance(cameras, np.ndarray):
+            intrinsics = intrinsics or Camera()
+            cameras = ShotSet.from_poses(
+                cameras,
+                intrinsics.fov_degree,
+                intrinsics.aspect_ratio,
+                intrinsics.z_near,
+                intrinsics.z_far,
+            )
+
+        resolution = tuple(resolution or self._fbo.size)
+        model = focal_plane_matrix(focus)
+        model_f4 = model.astype("f4")
+        packed = isinstance(shots, PackedShots)
+        program = self._packed_program if packed else self._program
+        if not packed:
+            self._shot_matrices.add(shots)
+            rows = [self._shot_matrices.row(shot) for shot in shots]
+
+        pending = None
+        for projection, view, vcam_matrix in _path_matrices(cameras):
+            # the caller may have used the renderer since the last frame
+            self._resize_targets(resolution, accumulate=True)
+            self._begin_accumulation(self._accumulation_fbo)
+            program["m_proj"].write(projection)
+            program["m_cam"].write(view)
+            program["m_model"].write(model_f4)
+            program["shotMatrices"].value = 1
+            if packed:
+                program["shotTextures"].value = 0
+                self._draw_packed(shots)
+            else:
+                program["shotTexture"].value = 0
+                # poses may have been updated since the last frame
+                matrices = self._shot_matrices.matrices(shots)
+                self._draw_shots(shots, rows, matrices, model, vcam_matrix)
+            frame = self._read_async(None, channels, dtype)
+            if pending is not None:
+                yield pending.result()
+            pending = frame
+        if pending is not None:
+            yield pending.result()
+
+    def pack(self, shots: List[Shot], release_textures: bool = False) -> PackedShots:
+        """Pack shots into texture arrays for ``Renderer.integrate_packed``.
+
+        Args:
+            shots (List[Shot]): the shots to pack
+            release_textures (bool): release the resident shot textures (through
+                ``residency`` if it is set) once they are packed, see ``PackedShots``
+
+        Returns:
+            PackedShots: the packed shots
+        """
+        return PackedShots(
+            shots,
+            ctx=self._ctx,
+            release_textures=release_textures,
+            residency=self._residency,
+        )
+
+    def integrate_tiled(
+        self,
+        shots: List[Shot],
+        vcam: Camera,
+        resolution: tuple,
+        focus=None,
+        tile_size: tuple = None,
+        out: np.ndarray = None,
+        filename: str = None,
+        channels: str = "BGRA",
+        dtype: str = "f4",
+    ) -> np.ndarray:
+        """Integrate multiple shots into an image larger than the framebuffer limits.
+
+        The frustum of the virtual camera is split into sub-frusta which are integrated
+        one tile at a time and streamed into the output array, e.g., a memory-mapped file.
+
+        Args:
+            shots (List[Shot]): the shots to integrate
+            vcam (Camera): the virtual camera
+            resolution (tuple): the resolution (width, height) of the whole image
+            focus (float): the distance of the focal plane or a (distance, normal) tuple,
+                see focal_plane_matrix
+            tile_size (tuple): the resolution of a tile, defaults to the largest supported
+                framebuffer size (at most 4096 x 4096)
+            out (np.ndarray): array of shape (H, W, len(channels)) to write to, e.g.,
+                a np.memmap. Allocated if None.
+            filename (str): if given and ``out`` is None, the image is written into a
+                memory-mapped .npy file at this path
+            channels (str): the channel order of the image, e.g., "BGRA", "BGR" or "RGB"
+            dtype (str): the dtype of the image, ignored if ``out`` is given
+
+        Returns:
+            np.ndarray: the integrated image
+        """
+        width, height = resolution
+        if tile_size is None:
+            limit = min(
+                self._ctx.info["GL_MAX_RENDERBUFFER_SIZE"],
+                self._ctx.info["GL_MAX_TEXTURE_SIZE"],
+                4096,
+            )
+            tile_size = (limit, limit)
+        tile_size = (min(tile_size[0], width), min(tile_size[1], height))
+        tile_width, tile_height = tile_size
+
+        shape = (height, width, len(channels))
+        if out is None:
+            if filename is not None:
+                out = np.lib.format.open_memmap(
+                    filename, mode="w+", dtype=dtype, shape=shape
+                )
+            else:
+                out = np.empty(shape, dtype=dtype)
+        elif out.shape != shape:
+            raise ValueError(f"Output array has shape {out.shape} instead of {shape}!")
+        tile = np.empty((tile_height, tile_width, len(channels)), dtype=out.dtype)
+
+        # swap in a tile-sized framebuffer, such that resizing does not release this one
+        fbo = self.fbo
+        if fbo.size != tile_size:
+            self.fbo = self._create_fbo(tile_size)
+        try:
+            for y0 in range(0, height, tile_height):
+                for x0 in range(0, width, tile_width):
+                    # tiles at the border reach beyond the image, only their valid part is copied
+                    crop = crop_matrix(
+                        2.0 * x0 / width - 1.0,
+                        2.0 * (x0 + tile_width) / width - 1.0,
+                        2.0 * y0 / height - 1.0,
+                        2.0 * (y0 + tile_height) / height - 1.0,
+                    )
+                    self.integrate(
+                        shots,
+                        _CroppedCamera(vcam, crop),
+                        focus,
+                        resolution=tile_size,
+                        out=tile,
+                        channels=channels,
+                    )
+                    w, h = min(tile_width, width - x0), min(tile_height, height - y0)
+                    # the output rows start at the top, OpenGL rows at the bottom
+                    out[height - y0 - h : height - y0, x0 : x0 + w] = tile[
+                        tile_height - h :, :w
+                    ]
+        finally:
+            self._release_tile_targets(fbo)
+
+        if isinstance(out, np.memmap):
+            out.flush()
+        return out
+
+    def _release_tile_targets(self, fbo: "moderngl.Framebuffer"):
+        """Restore the framebuffer used before tiling and free the tile-sized targets."""
+        if self.fbo is not fbo:
+            self._release_framebuffer(self.fbo)
+            self.fbo = fbo
+        if self._accumulation_fbo.size != fbo.size:
+            self._release_framebuffer(self._accumulation_fbo)
+            self._accumulation_fbo = self._create_accumulation_fbo(fbo.size)
+        for key, resolve_fbo in list(self._resolve_fbos.items()):
+            if resolve_fbo.size != fbo.size:
+                self._release_framebuffer(resolve_fbo)
+                del self._resolve_fbos[key]
+
+    def integrate_focal_stack(
+        self,
+        shots: List[Shot],
+        vcam: Camera,
+        depths: list,
+        resolution: tuple = None,
+        out: np.ndarray = None,
+        channels: str = "BGRA",
+        dtype: str = "f4",
+    ) -> np.ndarray:
+        """Integrate multiple shots for several focal planes in one pass.
+
+        Every shot is bound and drawn once; the plane is instanced per depth and a geometry
+        shader writes each instance into its own layer of a layered framebuffer. Versions of
+        moderngl that cannot attach texture arrays (before 5.13) integrate one depth at a time.
+
+        Args:
+            shots (List[Shot]): the shots to integrate
+            vcam (Camera): the virtual camera
+            depths (list): the focus of every focal plane, see focal_plane_matrix
+            resolution (tuple): the resolution of the images
+            out (np.ndarray): preallocated array of shape (D, H, W, len(channels)) to write to
+            channels (str): the channel order of the images, e.g., "BGRA", "BGR" or "RGB"
+            dtype (str): the dtype of the images, ignored if ``out`` is given
+
+        Returns:
+            np.ndarray: the integrated images with shape (D, H, W, C)
+        """
+        self._resize_targets(resolution)
+        width, height = self.fbo.size
+
+        stack = self._focal_stack_fbo
+        stack_size = (width, height, len(depths))
+        if self._layered_framebuffers and (
+            stack is None or stack.color_attachments[0].size != stack_size
+        ):
+            if stack is not None:
+                self._release_framebuffer(stack)
+            layers = self._ctx.texture_array(
+                stack_size, 4, dtype=self._accumulation_dtype
+            )
+            try:
+                stack = self._focal_stack_fbo = self._ctx.framebuffer(
+                    color_attachments=[layers]
+                )
+            except Exception:
+                # moderngl < 5.13 cannot attach texture arrays to framebuffers
+                layers.release()
+                stack = self._focal_stack_fbo = None
+                self._layered_framebuffers = False
+        if not self._layered_framebuffers:
+            return self._integrate_focal_stack_by_depth(
+                shots, vcam, depths, out, channels, dtype
+            )
+
+        models = np.stack([focal_plane_matrix(focus) for focus in depths]).astype("f4")
+        model_texture = self._ctx.texture((4, len(depths)), 4, models, dtype="f4")
+
+        self._shot_matrices.add(shots)
+        self._begin_accumulation(stack)
+
+        program = self._focal_stack_program
+        program["m_proj"].write(vcam.projection_matrix_f4)
+        program["m_cam"].write(vcam.view_matrix_f4)
+        program["shotTexture"].value = 0
+        program["shotMatrices"].value = 1
+        program["modelMatrices"].value = 2
+        self._shot_matrices.texture.use(1)
+        model_texture.use(2)
+        for shot in shots:
+            self.shot_texture(shot).use(0)
+            self.shot_sampler(shot.mipmaps).use(0)
+            program["shot_index"].value = self._shot_matrices.row(shot)
+            self._focal_stack_vao.render(self._ctx.TRIANGLES, instances=len(depths))
+        self._ctx.disable(self._ctx.BLEND)
+        model_texture.release()
+
+        return self._read(
+            stack.color_attachments[0],
+            out,
+            channels,
+            dtype,
+            normalize=True,
+            layers=len(depths),
+        )
+
+    def _integrate_focal_stack_by_depth(
+        self,
+        shots: List[Shot],
+        vcam: Camera,
+        depths: list,
+        out: np.ndarray,
+        channels: str,
+        dtype: str,
+    ) -> np.ndarray:
+        """Integrate the focal stack with one pass per depth, without layered rendering."""
+        width, height = self.fbo.size
+        shape = (len(depths), height, width, len(channels))
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        elif out.shape != shape:
+            raise ValueError(f"Output array has shape {out.shape} instead of {shape}!")
+        for image, focus in zip(out, depths):
+            self.integrate(shots, vcam, focus, out=image, channels=channels)
+        return out
 
     @property
     def fbo(self):
@@ -182,16 +1087,89 @@ class Renderer:
         return self._fbo
 
     @fbo.setter
-    def fbo(self, fbo: moderngl.Framebuffer):
+    def fbo(self, fbo: "moderngl.Framebuffer"):
         self._fbo = fbo
 
+    @property
+    def residency(self) -> TextureResidency:
+        """Get or Set the manager keeping the shot textures within a GPU memory budget.
+
+        If None (the default), every shot keeps its texture on the GPU.
+        """
+        return self._residency
+
+    @residency.setter
+    def residency(self, residency: TextureResidency):
+        self._residency = residency
+
+    def shot_texture(self, shot: Shot) -> "moderngl.Texture":
+        """The texture of a shot, made resident through ``residency`` if it is set."""
+        if self._residency is not None:
+            return self._residency.request(shot)
+        return shot.texture
+
+    def shot_sampler(self, mipmaps: bool) -> "moderngl.Sampler":
+        """The sampler to use for shot textures with or without mipmaps."""
+        return self._mipmap_sampler if mipmaps else self._linear_sampler
+
+    @property
+    def anisotropy(self) -> float:
+        """Get or Set the maximum anisotropy for sampling shot textures (1.0 disables
+        anisotropic filtering)."""
+        return self._mipmap_sampler.anisotropy
+
+    @anisotropy.setter
+    def anisotropy(self, value: float):
+        value = min(value, self._ctx.max_anisotropy)
+        self._mipmap_sampler.anisotropy = value
+        self._linear_sampler.anisotropy = value
+
+    @property
+    def min_lod(self) -> float:
+        """Get or Set the finest mipmap level sampled from shot textures with mipmaps.
+
+        Values above 0 cap the level of detail, e.g., for fast preview frames.
+        """
+        return self._mipmap_sampler.min_lod
+
+    @min_lod.setter
+    def min_lod(self, value: float):
+        self._mipmap_sampler.min_lod = value
+
+    @property
+    def culling(self) -> bool:
+        """Get or Set whether integrating skips shots that do not contribute to the image
+        and scissors the others to the bounding box of their footprint."""
+        return self._culling
+
+    @culling.setter
+    def culling(self, value: bool):
+        self._culling = value
+
+    @property
+    def shot_matrices(self) -> ShotMatrices:
+        """The GPU buffer holding the projection * view matrices of all shots used so far."""
+        return self._shot_matrices
+
+    def update_shot_poses(self, shots: List[Shot] = None):
+        """Upload the matrices of shots again (default: all known shots).
+
+        Poses changed through the setters of the shots are uploaded before the next draw
+        without this call; it is only needed after modifying a position or rotation in
+        place.
+
+        Args:
+            shots (List[Shot]): the shots that changed
+        """
+        self._shot_matrices.update(shots)
+
     @property
     def program(self):
         """The internal shader program used by the renderer."""
         return self._program
 
     @staticmethod
-    def _setup_alfr_program(ctx: moderngl.Context) -> moderngl.Program:
+    def _setup_alfr_program(ctx: "moderngl.Context") -> "moderngl.Program":
         """Setup the shader program to be used by the renderer."""
         return ctx.program(
             vertex_shader="""
@@ -202,9 +1180,9 @@ class Renderer:
                     uniform mat4 m_model;
                     uniform mat4 m_cam;
 
-                    // view and camera/projection matrix for one shot:
-                    uniform mat4 m_shot_cam;
-                    uniform mat4 m_shot_proj;
+                    // projection * view matrix of every shot, one row of 4 texels (columns) per shot
+                    uniform sampler2D shotMatrices;
+                    uniform int shot_index;
 
                     in vec3 in_position;
                     out vec4 wpos;
@@ -214,7 +1192,13 @@ class Renderer:
                         wpos = m_model * vec4(in_position, 1.0);
                         gl_Position = m_proj * m_cam * wpos;
 
-                        shotUV = m_shot_proj * m_shot_cam * wpos;
+                        mat4 m_shot = mat4(
+                            texelFetch(shotMatrices, ivec2(0, shot_index), 0),
+                            texelFetch(shotMatrices, ivec2(1, shot_index), 0),
+                            texelFetch(shotMatrices, ivec2(2, shot_index), 0),
+                            texelFetch(shotMatrices, ivec2(3, shot_index), 0)
+                        );
+                        shotUV = m_shot * wpos;
                     }
                 """,
             fragment_shader="""
@@ -230,14 +1214,201 @@ class Renderer:
                     void main() {
                         vec4 uv = shotUV;
                         uv = vec4(uv.xyz / uv.w / 2.0 + .5, 1.0); // perspective division and conversion to [0,1] from NDC
+                        // derivatives for mipmapping, computed before the non-uniform branch
+                        vec2 uv_dx = dFdx(uv.xy);
+                        vec2 uv_dy = dFdy(uv.xy);
 
                         if(uv.x < 0.0 || uv.x > 1.0 || uv.y < 0.0 || uv.y > 1.0) {
                             discard; // throw away the fragment 
                             color = vec4(0.0, 0.0, 0.0, 0.0);
                         } else {
                             // DEBUG: color = vec4(1.0, 1.0, 0.0, 1.0);
-                            color = vec4(texture(shotTexture, uv.xy).rgb, 1.0);
+                            color = vec4(textureGrad(shotTexture, uv.xy, uv_dx, uv_dy).rgb, 1.0);
+                        }
+                    }
+                """,
+        )
+
+    @staticmethod
+    def _setup_packed_program(ctx: "moderngl.Context") -> "moderngl.Program":
+        """Setup the shader program integrating all layers of a texture array in one pass."""
+        return ctx.program(
+            vertex_shader="""
+                    #version 330
+
+                    // model view projection matrices of the focus surface (virtual camera)
+                    uniform mat4 m_proj;
+                    uniform mat4 m_model;
+                    uniform mat4 m_cam;
+
+                    in vec3 in_position;
+                    out vec4 wpos;
+
+                    void main() {
+                        wpos = m_model * vec4(in_position, 1.0);
+                        gl_Position = m_proj * m_cam * wpos;
+                    }
+                """,
+            fragment_shader="""
+                    #version 330
+
+                    uniform sampler2DArray shotTextures;
+                    // projection * view matrix of every shot, one row of 4 texels (columns) per shot
+                    uniform sampler2D shotMatrices;
+                    uniform int shot_count;
+
+                    in vec4 wpos;
+                    out vec4 color;
+
+                    void main() {
+                        color = vec4(0.0, 0.0, 0.0, 0.0);
+                        for (int i = 0; i < shot_count; ++i) {
+                            mat4 m_shot = mat4(
+                                texelFetch(shotMatrices, ivec2(0, i), 0),
+                                texelFetch(shotMatrices, ivec2(1, i), 0),
+                                texelFetch(shotMatrices, ivec2(2, i), 0),
+                                texelFetch(shotMatrices, ivec2(3, i), 0)
+                            );
+                            vec4 uv = m_shot * wpos;
+                            uv = vec4(uv.xyz / uv.w / 2.0 + .5, 1.0); // perspective division and conversion to [0,1] from NDC
+                            // derivatives for mipmapping, computed before the non-uniform branch
+                            vec2 uv_dx = dFdx(uv.xy);
+                            vec2 uv_dy = dFdy(uv.xy);
+
+                            if(uv.x >= 0.0 && uv.x <= 1.0 && uv.y >= 0.0 && uv.y <= 1.0) {
+                                color += vec4(textureGrad(shotTextures, vec3(uv.xy, float(i)), uv_dx, uv_dy).rgb, 1.0);
+                            }
+                        }
+                    }
+                """,
+        )
+
+    @staticmethod
+    def _setup_focal_stack_program(ctx: "moderngl.Context") -> "moderngl.Program":
+        """Setup the shader program projecting a shot onto many focal planes at once.
+
+        The plane is drawn instanced, one instance per focal plane, and the geometry shader
+        routes every instance into its own layer of the framebuffer.
+        """
+        return ctx.program(
+            vertex_shader="""
+                    #version 330
+
+                    // view projection matrices of the virtual camera
+                    uniform mat4 m_proj;
+                    uniform mat4 m_cam;
+
+                    // model matrix of every focal plane, one row of 4 texels (columns) per plane
+                    uniform sampler2D modelMatrices;
+
+                    // projection * view matrix of every shot, one row of 4 texels (columns) per shot
+                    uniform sampler2D shotMatrices;
+                    uniform int shot_index;
+
+                    in vec3 in_position;
+                    out vec4 vShotUV;
+                    flat out int vLayer;
+
+                    void main() {
+                        mat4 m_model = mat4(
+                            texelFetch(modelMatrices, ivec2(0, gl_InstanceID), 0),
+                            texelFetch(modelMatrices, ivec2(1, gl_InstanceID), 0),
+                            texelFetch(modelMatrices, ivec2(2, gl_InstanceID), 0),
+                            texelFetch(modelMatrices, ivec2(3, gl_InstanceID), 0)
+                        );
+                        mat4 m_shot = mat4(
+                            texelFetch(shotMatrices, ivec2(0, shot_index), 0),
+                            texelFetch(shotMatrices, ivec2(1, shot_index), 0),
+                            texelFetch(shotMatrices, ivec2(2, shot_index), 0),
+                            texelFetch(shotMatrices, ivec2(3, shot_index), 0)
+                        );
+                        vec4 wpos = m_model * vec4(in_position, 1.0);
+                        gl_Position = m_proj * m_cam * wpos;
+                        vShotUV = m_shot * wpos;
+                        vLayer = gl_InstanceID;
+                    }
+                """,
+            geometry_shader="""
+                    #version 330
+
+                    layout(triangles) in;
+                    layout(triangle_strip, max_vertices = 3) out;
+
+                    in vec4 vShotUV[];
+                    flat in int vLayer[];
+                    out vec4 shotUV;
+
+                    void main() {
+                        for (int i = 0; i < 3; ++i) {
+                            gl_Layer = vLayer[0];
+                            gl_Position = gl_in[i].gl_Position;
+                            shotUV = vShotUV[i];
+                            EmitVertex();
+                        }
+                        EndPrimitive();
+                    }
+                """,
+            fragment_shader="""
+                    #version 330
+
+                    uniform sampler2D shotTexture;
+
+                    in vec4 shotUV;
+                    out vec4 color;
+
+                    void main() {
+                        vec4 uv = vec4(shotUV.xyz / shotUV.w / 2.0 + .5, 1.0); // perspective division and conversion to [0,1] from NDC
+                        // derivatives for mipmapping, computed before the non-uniform branch
+                        vec2 uv_dx = dFdx(uv.xy);
+                        vec2 uv_dy = dFdy(uv.xy);
+
+                        if(uv.x < 0.0 || uv.x > 1.0 || uv.y < 0.0 || uv.y > 1.0) {
+                            discard; // throw away the fragment
+                        } else {
+                            color = vec4(textureGrad(shotTexture, uv.xy, uv_dx, uv_dy).rgb, 1.0);
+                        }
+                    }
+                """,
+        )
+
+    @staticmethod
+    def _setup_resolve_program(ctx: "moderngl.Context") -> "moderngl.Program":
+        """Setup the fullscreen pass converting rendered images into the output format."""
+        return ctx.program(
+            vertex_shader="""
+                    #version 330
+
+                    void main() {
+                        // fullscreen triangle
+                        vec2 pos = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2);
+                        gl_Position = vec4(pos * 2.0 - 1.0, 0.0, 1.0);
+                    }
+                """,
+            fragment_shader="""
+                    #version 330
+
+                    uniform sampler2D source;
+                    uniform sampler2DArray sourceLayers;
+                    uniform bool layered;
+                    uniform int layer;
+
+                    uniform bool normalize; // divide by the number of shots in the alpha channel
+                    uniform float scale;
+                    uniform ivec4 swizzle; // source channel of every output channel
+
+                    out vec4 color;
+
+                    void main() {
+                        ivec2 size = layered ? textureSize(sourceLayers, 0).xy : textureSize(source, 0);
+                        ivec2 p = ivec2(gl_FragCoord.xy);
+                        p.y = size.y - 1 - p.y; // flip image vertically (opencv rows start at the top)
+
+                        vec4 c = layered ? texelFetch(sourceLayers, ivec3(p, layer), 0) : texelFetch(source, p, 0);
+                        if (normalize) {
+                            c = c.a > 0.0 ? c / c.a : vec4(0.0); // uncovered pixels are 0
                         }
+                        c *= scale;
+                        color = vec4(c[swizzle.x], c[swizzle.y], c[swizzle.z], c[swizzle.w]);
                     }
                 """,
         )
@@ -0,0 +1,144 @@
+import weakref
+from alfr.shot import Shot
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import moderngl
+
+
+class TextureResidency:
+    """Keeps the shot textures on the GPU within a memory budget.
+
+    Textures are uploaded on demand when the renderer requests them and the least
+    recently used textures are released once the budget is exceeded. Released textures
+    are uploaded again from the shot's image (or image file) when they are needed again.
+    Textures shared by several shots through a ``TextureCache`` are counted once and
+    evicting them releases them from the cache, unless a shot outside the residency
+    still uses them. Assign the residency to ``Renderer.residency`` to use it.
+    """
+
+    def __init__(self, budget_bytes: int):
+        """Create the residency manager.
+
+        Args:
+            budget_bytes (int): the GPU memory the shot textures may use in bytes
+        """
+        self._budget = int(budget_bytes)
+        # weak reference to shot -> (texture, bytes), in LRU order
+        self._resident = OrderedDict()
+        self._users = {}  # texture -> number of resident shots using it
+        self._resident_bytes = 0
+        self.reset_stats()
+
+    @property
+    def budget(self) -> int:
+        """Get or Set the memory budget in bytes; lowering it evicts textures."""
+        return self._budget
+
+    @budget.setter
+    def budget(self, budget_bytes: int):
+        self._budget = int(budget_bytes)
+        self._evict_to_budget()
+
+    @property
+    def resident_bytes(self) -> int:
+        """The GPU memory used by the resident textures in bytes."""
+        return self._resident_bytes
+
+    def __len__(self) -> int:
+        return len(self._resident)
+
+    def stats(self) -> dict:
+        """The number of hits, misses and evictions, the hit rate and resident bytes."""
+        requests = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "hit_rate": self._hits / requests if requests > 0 else 0.0,
+            "resident": len(self._resident),
+            "resident_bytes": self._resident_bytes,
+        }
+
+    def reset_stats(self):
+        """Reset the hit, miss and eviction counters."""
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def request(self, shot: Shot) -> "moderngl.Texture":
+        """Get the texture of a shot, uploading it and evicting other textures if needed.
+
+        Args:
+            shot (Shot): the shot about to be rendered
+
+        Returns:
+            moderngl.Texture: the resident texture of the shot
+        """
+        key = weakref.ref(shot, self._forget)
+        if key in self._resident and shot.resident:
+            self._hits += 1
+            self._resident.move_to_end(key)
+            return shot.texture
+
+        if shot.resident:
+            self._hits += 1  # uploaded outside of the residency, start tracking it
+        else:
+            self._misses += 1
+        texture = shot.texture
+        self._track(key, texture, shot.texture_nbytes)
+        # never evict the requested texture, even if it exceeds the budget on its own
+        self._evict_to_budget(keep=key)
+        return texture
+
+    def evict(self, shot: Shot):
+        """Release the texture of a shot."""
+        self._untrack(weakref.ref(shot))
+        # a cached texture without users would stay in the cache, outside the budget
+        shot.release_texture(keep_cached=False)
+
+    def clear(self):
+        """Release all resident textures."""
+        for key in list(self._resident):
+            shot = key()
+            if shot is not None:
+                self.evict(shot)
+
+    def _track(self, key: weakref.ref, texture: "moderngl.Texture", nbytes: int):
+        self._untrack(key)
+        self._resident[key] = (texture, nbytes)
+        # shared textures only count once
+        users = self._users.get(texture, 0)
+        if users == 0:
+            self._resident_bytes += nbytes
+        self._users[texture] = users + 1
+
+    def _untrack(self, key: weakref.ref):
+        entry = self._resident.pop(key, None)
+        if entry is None:
+            return
+        texture, nbytes = entry
+        self._users[texture] -= 1
+        if self._users[texture] == 0:
+            del self._users[texture]
+            self._resident_bytes -= nbytes
+
+    def _forget(self, key: weakref.ref):
+        """Stop tracking a shot that was garbage collected."""
+        self._untrack(key)
+
+    def _evict_to_budget(self, keep: weakref.ref = None):
+        while self._resident_bytes > self._budget and len(self._resident) > 0:
+            key = next(iter(self._resident))
+            if key == keep:
+                if len(self._resident) == 1:
+                    return
+                self._resident.move_to_end(key)
+                continue
+            shot = key()
+            if shot is None:
+                self._forget(key)
+                continue
+            self.evict(shot)
+            self._evictions += 1
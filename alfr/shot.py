@@ -1,17 +1,53 @@
 import numpy as np
-import cv2
-import moderngl
 from alfr.globals import ContextManager
 from alfr.camera import Camera
+from alfr.cache import TextureCache
 from pyrr import Matrix44, Matrix33, Quaternion, Vector3, vector
 import json
 import os
-from typing import Union
+import warnings
+import weakref
+from typing import Iterable, List, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import moderngl
+
+# texture storage formats of shots:
+# name -> (components, moderngl dtype, compressed internal format, required extension)
+TEXTURE_FORMATS = {
+    "rgb8": (3, "f1", None, None),
+    "r8": (1, "f1", None, None),
+    "r16": (1, "nu2", None, None),
+    # block-compressed formats, compressed by the driver on upload
+    "bc1": (3, "f1", 0x83F0, "GL_EXT_texture_compression_s3tc"),  # 4 bits per pixel
+    "bc4": (1, "f1", 0x8DBB, "GL_ARB_texture_compression_rgtc"),  # 4 bits per pixel
+    "bc7": (3, "f1", 0x8E8C, "GL_ARB_texture_compression_bptc"),  # 8 bits per pixel
+}
+
+# what a shot keeps of its decoded image once the texture is uploaded
+IMAGE_RETENTIONS = ("keep", "drop", "thumbnail")
 
 
 class Shot(Camera):
     """One perspective of the light field"""
 
+    __slots__ = (
+        "_ctx",
+        "_filename",
+        "_image_retention",
+        "_image_scale",
+        "_img",
+        "_internal_format",
+        "_mipmaps",
+        "_release_cached",
+        "_size",
+        "_texture",
+        "_texture_cache",
+        "_texture_format",
+        "_thumbnail",
+        "_thumbnail_size",
+    )
+
     def __init__(
         self,
         shot_filename: Union[str, np.ndarray],
@@ -19,8 +55,47 @@ class Shot(Camera):
         shot_rotation: Quaternion,
         shot_fovy_degrees: float = 60.0,
         shot_aspect_ratio: float = 1.0,
-        ctx: moderngl.Context = ContextManager.get_default_context(),
+        ctx: "moderngl.Context" = None,
+        mipmaps: bool = False,
+        texture_format: str = "rgb8",
+        lazy: bool = False,
+        image_retention: str = "keep",
+        thumbnail_size: int = 256,
+        image_scale: float = 1.0,
+        texture_cache: TextureCache = None,
     ):
+        """Create a shot and upload its image.
+
+        Args:
+            shot_filename (str | np.ndarray): the image file or the image (RGB, flipped vertically)
+            shot_position (Vector3): the position of the camera
+            shot_rotation (Quaternion): the rotation of the camera
+            shot_fovy_degrees (float): the vertical field of view in degrees
+            shot_aspect_ratio (float): the aspect ratio (width / height) of the image
+            ctx (moderngl.Context): the OpenGL context to create the texture with, by
+                default the default context, which is created on the first upload
+            mipmaps (bool): build mipmaps, such that the renderer samples the image
+                trilinearly (and anisotropically) when it is minified
+            texture_format (str): how the image is stored on the GPU, one of
+                ``TEXTURE_FORMATS``: "rgb8" (default), single channel "r8" or "r16"
+                (e.g., for grayscale or thermal images) or block-compressed "bc1",
+                "bc4" (single channel) or "bc7"; compressed formats fall back to the
+                uncompressed format with the same channels if the driver lacks support
+            lazy (bool): only remember the image file and decode and upload the image on
+                first use (or ``preload``), e.g., to inspect the poses of a dataset quickly
+            image_retention (str): what is kept of the image in host memory after the
+                upload: the full image ("keep", default), nothing ("drop") or a
+                downsampled copy ("thumbnail"). Released textures are uploaded again from
+                the image file if the image is not kept, so images given as arrays are
+                always kept.
+            thumbnail_size (int): the longer edge of the thumbnail in pixels
+            image_scale (float): scale factor (at most 1) applied to the image before it
+                is uploaded; image files are decoded at a reduced size where the format
+                allows it (e.g., JPEG). The field of view and aspect ratio are unchanged.
+            texture_cache (TextureCache): share the texture with other shots of the same
+                image file through this cache; shots that find their texture in the cache
+                do not decode their image until ``image`` is accessed
+        """
         super().__init__(
             field_of_view_degrees=shot_fovy_degrees,
             ratio=shot_aspect_ratio,
@@ -28,39 +103,492 @@ class Shot(Camera):
             quaternion=shot_rotation,
         )
 
-        # global g.ctx
-        if ctx is None:
-            raise RuntimeError("No OpenGL context available!")
+        if image_retention not in IMAGE_RETENTIONS:
+            raise ValueError(
+                f"Unknown image retention {image_retention}, "
+                f"use one of {list(IMAGE_RETENTIONS)}!"
+            )
 
         # one perspective of the light field
         # self.texture = window.load_texture_2d(shot_filename)
+        if texture_format not in TEXTURE_FORMATS:
+            raise ValueError(
+                f"Unknown texture format {texture_format}, "
+                f"use one of {list(TEXTURE_FORMATS)}!"
+            )
+        if ctx is None and texture_cache is not None:
+            ctx = texture_cache.ctx
+        elif texture_cache is not None and texture_cache.ctx is not ctx:
+            raise ValueError("The texture cache belongs to another OpenGL context!")
+        self._texture_cache = texture_cache
+        self._release_cached = None
+
+        if not 0.0 < image_scale <= 1.0:
+            raise ValueError(f"The image scale must be in (0, 1], not {image_scale}!")
+        self._image_scale = image_scale
+
         self._filename = None
         if isinstance(shot_filename, str):
-            img = self._load_image(shot_filename)
+            img = None  # decoded by preload, unless the texture cache has the texture
             self._filename = shot_filename
         elif isinstance(shot_filename, np.ndarray):
-            img = shot_filename
+            img = self._resize_image(shot_filename, image_scale)
+            img = self._convert_image(img, texture_format)
         else:
             raise Exception("Unknown type for {shot_filename}")
-        self.texture = ctx.texture(img.shape[1::-1], img.shape[2], img)
+        self._ctx = None
+        self._texture_format = texture_format
+        self._internal_format = TEXTURE_FORMATS[texture_format][2]
+        if ctx is not None:
+            self._use_context(ctx)
+        self._mipmaps = mipmaps
+        self._size = None
+        self._texture = None
         self._img = img  # opencv image
+        self._image_retention = image_retention
+        self._thumbnail_size = thumbnail_size
+        self._thumbnail = None
+        if not lazy:
+            self.preload()
+
+    def _invalidate_projection(self):
+        super()._invalidate_projection()
+        ShotMatrices._pose_changed(self)
+
+    def _invalidate_view(self):
+        super()._invalidate_view()
+        ShotMatrices._pose_changed(self)
 
     @property
     def image_file(self):
         return self._filename
 
-    def _load_image(self, texture_filename) -> np.ndarray:
-        img = cv2.imread(texture_filename)
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)  # convert to RGB, opencv uses BGR
-        img = np.flip(img, 0).copy(order="C")  # flip image vertically
-        return img
+    @property
+    def mipmaps(self) -> bool:
+        """Whether the texture of the shot has mipmaps."""
+        return self._mipmaps
+
+    @property
+    def texture_format(self) -> str:
+        """The storage format of the texture, see ``TEXTURE_FORMATS``."""
+        return self._texture_format
+
+    @property
+    def texture(self) -> "moderngl.Texture":
+        """The texture of the shot, uploaded again if it was released."""
+        if self._texture is None:
+            self.preload()
+        return self._texture
+
+    @property
+    def resident(self) -> bool:
+        """Whether the texture of the shot is on the GPU."""
+        return self._texture is not None
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the image of the shot was decoded, which lazy shots defer."""
+        return self._img is not None or self._texture is not None
+
+    @property
+    def image_retention(self) -> str:
+        """What is kept of the image after the upload, see ``IMAGE_RETENTIONS``."""
+        return self._image_retention
+
+    @property
+    def image(self) -> np.ndarray:
+        """The decoded image (flipped vertically), None if it is not kept.
+
+        Shots that took their texture from the texture cache did not decode their image;
+        with the "keep" retention, it is decoded on first access.
+        """
+        if (
+            self._img is None
+            and self._image_retention == "keep"
+            and self._texture is not None
+            and self._filename is not None
+        ):
+            self._img = self._load_image(self._filename, self._texture_format)
+        return self._img
+
+    @property
+    def thumbnail(self) -> np.ndarray:
+        """The downsampled image kept by the "thumbnail" retention, else None."""
+        return self._thumbnail
+
+    def decode(self):
+        """Decode the image into host memory without touching the GPU.
+
+        Unlike ``preload``, this can run in a worker thread (OpenCV releases the GIL).
+        """
+        if self._texture is None:
+            key = self._cache_key()
+            if key is None or key not in self._texture_cache:
+                self._image()
+
+    def read_image(self) -> np.ndarray:
+        """The image as it is stored in the texture, without uploading it.
+
+        Images that are not kept in host memory are decoded from the image file and
+        only kept if the image retention is "keep".
+        """
+        if self._img is None and self._image_retention != "keep" and self._filename:
+            return self._load_image(self._filename, self._texture_format)
+        return self._image()
+
+    def preload(self, buffer: "moderngl.Buffer" = None):
+        """Decode the image and upload the texture now instead of on first use.
+
+        Args:
+            buffer (moderngl.Buffer): optional pixel unpack buffer to stage the image in,
+                such that the driver copies it to the texture asynchronously, see
+                ``TextureUploader``
+        """
+        if self._texture is None and not self._acquire_cached():
+            self._upload(self._image(), buffer)
+            self._add_to_cache()
+            self._retain_image()
+
+    def _cache_key(self) -> tuple:
+        """The key of the texture in the texture cache, None if it is not cached."""
+        if self._texture_cache is None or self._filename is None:
+            return None
+        return TextureCache.key(
+            self._filename, self._texture_format, self._mipmaps, self._image_scale
+        )
+
+    def _acquire_cached(self) -> bool:
+        """Use the texture from the cache if it holds one for the shot's image."""
+        key = self._cache_key()
+        texture = None if key is None else self._texture_cache.acquire(key)
+        if texture is None:
+            return False
+        self._texture = texture
+        self._size = texture.size
+        self._release_cached = weakref.finalize(self, self._texture_cache.release, key)
+        return True
+
+    def _add_to_cache(self):
+        key = self._cache_key()
+        if key is not None:
+            self._texture_cache.add(key, self._texture, self.texture_nbytes)
+            self._release_cached = weakref.finalize(
+                self, self._texture_cache.release, key
+            )
+
+    def _retain_image(self):
+        """Apply the image retention after the upload."""
+        if self._image_retention == "keep" or self._filename is None:
+            return  # images without a file cannot be loaded again
+        if self._image_retention == "thumbnail" and self._thumbnail is None:
+            height, width = self._img.shape[:2]
+            scale = min(1.0, self._thumbnail_size / max(width, height))
+            self._thumbnail = self._resize_image(self._img, scale)
+        self._img = None
+
+    @property
+    def texture_nbytes(self) -> int:
+        """The (estimated) GPU memory used by the texture of the shot in bytes.
+
+        Lazy shots are loaded to know the size of their image.
+        """
+        if self._size is None:
+            self.preload()
+        components, dtype, _, _ = TEXTURE_FORMATS[self._texture_format]
+        if self._internal_format is not None:
+            bytes_per_pixel = 1.0 if self._texture_format == "bc7" else 0.5
+        else:
+            bytes_per_pixel = components * int(dtype[-1])
+        nbytes = self._size[0] * self._size[1] * bytes_per_pixel
+        if self._mipmaps:
+            nbytes *= 4.0 / 3.0  # the mipmap chain adds a third
+        return int(nbytes)
+
+    def release_texture(self, keep_cached: bool = True):
+        """Release the texture of the shot to free GPU memory.
+
+        The texture is uploaded again from the image (or the image file) on the next access.
+        Textures shared through the texture cache are only released once no other shot
+        uses them.
+
+        Args:
+            keep_cached (bool): let the texture cache keep a texture no other shot uses
+                for reuse (within its budget) instead of releasing it right away
+        """
+        if self._texture is not None:
+            if self._release_cached is not None:
+                _, _, (key,), _ = self._release_cached.detach()
+                self._texture_cache.release(key, keep=keep_cached)
+                self._release_cached = None
+            else:
+                self._texture.release()
+            self._texture = None
+
+    def _image(self) -> np.ndarray:
+        """The image of the shot, loaded from its file if it is not in memory yet."""
+        if self._img is None:
+            if self._filename is None:
+                raise RuntimeError(
+                    "The image of the shot is neither kept nor in a file!"
+                )
+            self._img = self._load_image(self._filename, self._texture_format)
+        return self._img
+
+    def _use_context(self, ctx: "moderngl.Context"):
+        """Create the texture with the given context, falling back to an uncompressed
+        format if it does not support the requested one."""
+        self._ctx = ctx
+        components, _, _, extension = TEXTURE_FORMATS[self._texture_format]
+        if extension is not None and extension not in ctx.extensions:
+            fallback = "rgb8" if components == 3 else "r8"
+            warnings.warn(
+                f"{extension} is not supported, storing shots as {fallback} "
+                f"instead of {self._texture_format}!"
+            )
+            self._texture_format = fallback
+            self._internal_format = None
+
+    def _upload(self, img: np.ndarray, buffer: "moderngl.Buffer" = None):
+        if self._ctx is None:
+            self._use_context(ContextManager.get_default_context())
+        components, dtype, _, _ = TEXTURE_FORMATS[self._texture_format]
+        self._size = img.shape[1::-1]
+        self._texture = self._ctx.texture(
+            img.shape[1::-1],
+            components,
+            img if buffer is None else None,
+            dtype=dtype,
+            internal_format=self._internal_format,
+        )
+        if buffer is not None:
+            # orphaning gives fresh storage if the buffer is still read by a transfer
+            buffer.orphan(img.nbytes)
+            buffer.write(img)
+            self._texture.write(buffer)
+        if components == 1:
+            self._texture.swizzle = "RRR1"  # sample single channel images as gray
+        if self._mipmaps:
+            self._texture.build_mipmaps()
+
+    @property
+    def image_scale(self) -> float:
+        """The scale factor applied to the image before it is uploaded."""
+        return self._image_scale
+
+    def _load_image(self, texture_filename, texture_format="rgb8") -> np.ndarray:
+        import cv2  # imported on first use, it is slow to import
+
+        components, dtype, _, _ = TEXTURE_FORMATS[texture_format]
+        # flags to decode at 1/2, 1/4 or 1/8 of the size
+        if components == 1:
+            flags = cv2.IMREAD_GRAYSCALE
+            reduced = {
+                2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+                4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+            }
+            # keep 16 bit sources (e.g., thermal images) for r16
+            if dtype == "nu2":
+                flags |= cv2.IMREAD_ANYDEPTH
+        else:
+            flags = cv2.IMREAD_COLOR
+            reduced = {
+                2: cv2.IMREAD_REDUCED_COLOR_2,
+                4: cv2.IMREAD_REDUCED_COLOR_4,
+                8: cv2.IMREAD_REDUCED_COLOR_8,
+            }
+
+        # let the decoder skip the largest power of two reduction that is not too small
+        reduction = max(r for r in (1, 2, 4, 8) if r * self._image_scale <= 1.0)
+        img = cv2.imread(texture_filename, flags | reduced.get(reduction, 0))
+        if img is None:
+            raise FileNotFoundError(f"Cannot read the image {texture_filename}!")
+        # the reduced image is (rounded up) 1 / reduction of the full size
+        img = self._resize_image(img, self._image_scale * reduction)
+        if components != 1:
+            # convert to RGB, opencv uses BGR
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        img = np.flip(img, 0)  # flip image vertically
+        return self._convert_image(img, texture_format)
+
+    @staticmethod
+    def _resize_image(img: np.ndarray, scale: float) -> np.ndarray:
+        """Downscale an image by the given factor, averaging the pixels."""
+        import cv2
+
+        if scale >= 1.0:
+            return img
+        height, width = img.shape[:2]
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def _convert_image(img: np.ndarray, texture_format: str) -> np.ndarray:
+        """Convert an RGB or gray image to the channels and depth of the texture format."""
+        import cv2
+
+        components, dtype, _, _ = TEXTURE_FORMATS[texture_format]
+        channels = 1 if img.ndim == 2 else img.shape[2]
+        if components == 1 and channels == 3:
+            img = cv2.cvtColor(np.ascontiguousarray(img), cv2.COLOR_RGB2GRAY)
+        elif components == 3 and channels == 1:
+            img = cv2.cvtColor(np.ascontiguousarray(img), cv2.COLOR_GRAY2RGB)
+        if dtype == "nu2" and img.dtype == np.uint8:
+            img = img.astype(np.uint16) * 257  # scale to the full 16 bit range
+        elif dtype == "f1" and img.dtype == np.uint16:
+            img = (img // 257).astype(np.uint8)
+        return np.ascontiguousarray(img)
 
     def use(self, renderer):
         """
         Use this perspective of the light field.
         """
-        self.texture.use(0)
+        renderer.shot_texture(self).use(0)
+        renderer.shot_sampler(self._mipmaps).use(0)
+
+        # the matrices of the shot are already on the GPU, only select them
+        renderer.program["shot_index"].value = renderer.shot_matrices.row(self)
+
+
+class ShotMatrices:
+    """GPU buffer holding the combined projection * view matrix of many shots.
+
+    The matrices are stored in a float texture with one row of 4 texels (the matrix
+    columns) per shot, which the shaders read with texelFetch. A shot gets a row when it
+    is added. Rows of shots whose pose or intrinsics were changed through a setter are
+    marked and uploaded again by ``sync``, which ``add`` and ``matrices`` call before the
+    renderer draws. Rows of garbage-collected shots are reused. A copy of the matrices is
+    kept on the CPU for culling.
+    """
+
+    # all buffers, such that a shot can mark its rows when its pose changes
+    _instances = weakref.WeakSet()
+
+    @classmethod
+    def _pose_changed(cls, shot: Shot):
+        for shot_matrices in cls._instances:
+            if shot in shot_matrices._rows:
+                shot_matrices._dirty.add(shot)
+
+    def __init__(
+        self,
+        shots: Iterable[Shot] = (),
+        ctx: "moderngl.Context" = None,
+        capacity: int = 64,
+    ):
+        """Create the buffer and upload the matrices of the given shots.
+
+        Args:
+            shots (Iterable[Shot]): the shots to add, rows are assigned in the given order
+            ctx (moderngl.Context): the OpenGL context to create the texture with, by
+                default the default context
+            capacity (int): the initial number of rows; the buffer grows on demand
+        """
+        shots = list(shots)
+        if ctx is None:
+            ctx = ContextManager.get_default_context()
+        self._ctx = ctx
+        self._rows = weakref.WeakKeyDictionary()
+        self._dirty = weakref.WeakSet()  # shots whose matrix changed since the upload
+        self._free_rows = []
+        self._num_rows = 0
+        self._texture = ctx.texture((4, max(capacity, len(shots), 1)), 4, dtype="f4")
+        self._matrices = np.zeros((self._texture.height, 4, 4), dtype="f4")
+        ShotMatrices._instances.add(self)
+        self.add(shots)
+
+    @property
+    def texture(self) -> "moderngl.Texture":
+        """The float texture holding the matrices."""
+        return self._texture
+
+    def add(self, shots: Iterable[Shot]):
+        """Add shots that are not in the buffer yet and upload their matrices."""
+        self.sync()
+        new_shots = [shot for shot in dict.fromkeys(shots) if shot not in self._rows]
+        if len(new_shots) == 0:
+            return
+
+        for shot in new_shots:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                row = self._num_rows
+                self._num_rows += 1
+            self._rows[shot] = row
+            weakref.finalize(shot, self._free_rows.append, row)
+
+        if self._num_rows > self._texture.height:
+            self._grow(max(self._num_rows, 2 * self._texture.height))
+
+        self._upload(new_shots)
+
+    def contains(self, shot: Shot) -> bool:
+        """Whether the buffer holds the matrix of the given shot."""
+        return shot in self._rows
+
+    def row(self, shot: Shot) -> int:
+        """Get the row of a shot's matrix, adding the shot if necessary."""
+        row = self._rows.get(shot)
+        if row is None:
+            self.add([shot])
+            row = self._rows[shot]
+        return row
+
+    def matrices(self, shots: List[Shot]) -> np.ndarray:
+        """Get the matrices (as stored by pyrr) of the given shots, which must be added.
+
+        Returns:
+            np.ndarray: array with shape (len(shots), 4, 4)
+        """
+        self.sync()
+        return self._matrices[[self._rows[shot] for shot in shots]]
+
+    def update(self, shots: Iterable[Shot] = None):
+        """Upload the matrices of the given shots (default: all shots) again.
+
+        Changes through the setters of the shots are uploaded by ``sync``; call this
+        after modifying a position or rotation in place.
+        """
+        if shots is None:
+            shots = list(self._rows.keys())
+        self.add(shots)
+        self._upload(shots)
+
+    def sync(self):
+        """Upload the matrices of the shots whose pose changed since their upload."""
+        if len(self._dirty) > 0:
+            shots = list(self._dirty)
+            self._dirty.clear()
+            self._upload(shots)
+
+    def _grow(self, height: int):
+        old = self._texture
+        self._texture = self._ctx.texture((4, height), 4, dtype="f4")
+        self._texture.write(self._matrices.tobytes(), viewport=(0, 0, 4, old.height))
+        old.release()
+        matrices = np.zeros((height, 4, 4), dtype="f4")
+        matrices[: len(self._matrices)] = self._matrices
+        self._matrices = matrices
+
+    def _upload(self, shots: Iterable[Shot]):
+        """Upload the matrices of the given shots, one write per run of consecutive rows."""
+        by_row = sorted({self._rows[shot]: shot for shot in shots}.items())
+        start = 0
+        while start < len(by_row):
+            end = start + 1
+            while end < len(by_row) and by_row[end][0] == by_row[end - 1][0] + 1:
+                end += 1
+            first, count = by_row[start][0], end - start
+            self._matrices[first : first + count] = [
+                shot.projection_matrix * shot.view_matrix
+                for _, shot in by_row[start:end]
+            ]
+            self._texture.write(
+                self._matrices[first : first + count], viewport=(0, first, 4, count)
+            )
+            start = end
 
-        # get uniforms from shader program and set them
-        renderer.program["m_shot_proj"].write(self.projection_matrix.astype("f4"))
-        renderer.program["m_shot_cam"].write(self.view_matrix.astype("f4"))
+    def release(self):
+        """Release the GPU resources."""
+        self._texture.release()
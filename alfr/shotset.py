@@ -0,0 +1,194 @@
+import numpy as np
+from alfr.shot import Shot
+from typing import Iterator, List, Union
+
+
+def rotation_matrices(quaternions: np.ndarray) -> np.ndarray:
+    """Rotation matrices of quaternions, as pyrr's ``Matrix33.from_quaternion``.
+
+    Args:
+        quaternions (np.ndarray): quaternions (x, y, z, w) with shape (N, 4)
+
+    Returns:
+        np.ndarray: the matrices (as stored by pyrr) with shape (N, 3, 3)
+    """
+    x, y, z, w = np.asarray(quaternions, dtype=float).T
+    inv = 1.0 / (x * x + y * y + z * z + w * w)
+    m = np.empty((len(inv), 3, 3))
+    m[:, 0, 0] = (x * x - y * y - z * z + w * w) * inv
+    m[:, 1, 1] = (-x * x + y * y - z * z + w * w) * inv
+    m[:, 2, 2] = (-x * x - y * y + z * z + w * w) * inv
+    m[:, 1, 0] = 2.0 * (x * y + z * w) * inv
+    m[:, 0, 1] = 2.0 * (x * y - z * w) * inv
+    m[:, 2, 0] = 2.0 * (x * z - y * w) * inv
+    m[:, 0, 2] = 2.0 * (x * z + y * w) * inv
+    m[:, 2, 1] = 2.0 * (y * z + x * w) * inv
+    m[:, 1, 2] = 2.0 * (y * z - x * w) * inv
+    return m
+
+
+class ShotSet:
+    """Poses and intrinsics of shots stored as contiguous arrays.
+
+    The matrices of all shots are computed with one vectorised call instead of one pyrr
+    call per shot. Indexing with an integer returns the shot, slices, index arrays and
+    boolean masks return a new ``ShotSet`` of the same shots, without touching their
+    textures. The arrays are a snapshot: call ``update`` after the poses of the shots
+    changed.
+    """
+
+    def __init__(self, shots: List[Shot]):
+        """Gather the poses and intrinsics of the shots.
+
+        Args:
+            shots (List[Shot]): the shots (or other cameras)
+        """
+        n = len(shots)
+        self._shots = np.empty(n, dtype=object)
+        self._shots[:] = list(shots)
+        self._positions = np.zeros((n, 3))
+        self._quaternions = np.zeros((n, 4))
+        self._fovs = np.zeros(n)
+        self._aspect_ratios = np.zeros(n)
+        self._z_near = np.zeros(n)
+        self._z_far = np.zeros(n)
+        self.update()
+
+    @classmethod
+    def from_poses(
+        cls,
+        poses: np.ndarray,
+        fov_degree: float = 60.0,
+        aspect_ratio: float = 1.0,
+        z_near: float = 0.1,
+        z_far: float = 10000.0,
+    ) -> "ShotSet":
+        """Create a set of cameras from an array of poses, e.g., a path of virtual cameras.
+
+        There are no camera objects behind the poses: indexing the set with an integer
+        returns None and ``update`` must not be called.
+
+        Args:
+            poses (np.ndarray): positions and rotations as quaternions (x, y, z, w) with
+                shape (N, 7)
+            fov_degree (float): the vertical field of view in degrees of all cameras
+            aspect_ratio (float): the aspect ratio (width / height) of all cameras
+            z_near (float): the near clipping plane of all cameras
+            z_far (float): the far clipping plane of all cameras
+
+        Returns:
+            ShotSet: the cameras
+        """
+        poses = np.asarray(poses, dtype=float)
+        if poses.ndim != 2 or poses.shape[1] != 7:
+            raise ValueError(f"Poses must have shape (N, 7), got {poses.shape}!")
+        n = len(poses)
+        return cls._from_arrays(
+            np.full(n, None, dtype=object),
+            poses[:, :3].copy(),
+            poses[:, 3:].copy(),
+            np.full(n, float(fov_degree)),
+            np.full(n, float(aspect_ratio)),
+            np.full(n, float(z_near)),
+            np.full(n, float(z_far)),
+        )
+
+    @classmethod
+    def _from_arrays(cls, shots, positions, quaternions, fovs, ratios, z_near, z_far):
+        shot_set = cls.__new__(cls)
+        shot_set._shots = shots
+        shot_set._positions = positions
+        shot_set._quaternions = quaternions
+        shot_set._fovs = fovs
+        shot_set._aspect_ratios = ratios
+        shot_set._z_near = z_near
+        shot_set._z_far = z_far
+        return shot_set
+
+    def update(self):
+        """Gather the poses and intrinsics of the shots again."""
+        for i, shot in enumerate(self._shots):
+            self._positions[i] = shot.position
+            self._quaternions[i] = shot.rotation
+            self._fovs[i] = shot.fov_degree
+            self._aspect_ratios[i] = shot.aspect_ratio
+            self._z_near[i] = shot.z_near
+            self._z_far[i] = shot.z_far
+
+    def __len__(self) -> int:
+        return len(self._shots)
+
+    def __iter__(self) -> Iterator[Shot]:
+        return iter(self._shots)
+
+    def __getitem__(self, index) -> Union[Shot, "ShotSet"]:
+        if isinstance(index, (int, np.integer)):
+            return self._shots[index]
+        return self._from_arrays(
+            self._shots[index],
+            self._positions[index],
+            self._quaternions[index],
+            self._fovs[index],
+            self._aspect_ratios[index],
+            self._z_near[index],
+            self._z_far[index],
+        )
+
+    @property
+    def shots(self) -> List[Shot]:
+        """The shots."""
+        return list(self._shots)
+
+    @property
+    def positions(self) -> np.ndarray:
+        """The positions with shape (N, 3)."""
+        return self._positions
+
+    @property
+    def quaternions(self) -> np.ndarray:
+        """The rotations as quaternions (x, y, z, w) with shape (N, 4)."""
+        return self._quaternions
+
+    @property
+    def fovs(self) -> np.ndarray:
+        """The vertical fields of view in degrees with shape (N,)."""
+        return self._fovs
+
+    @property
+    def aspect_ratios(self) -> np.ndarray:
+        """The aspect ratios (width / height) with shape (N,)."""
+        return self._aspect_ratios
+
+    def directions(self) -> np.ndarray:
+        """The normalized viewing directions with shape (N, 3)."""
+        # cameras look along -z in view space, the rows of the stored rotation are the
+        # view space axes in world space
+        return -rotation_matrices(self._quaternions)[:, :, 2]
+
+    def view_matrices(self) -> np.ndarray:
+        """The view matrices (as stored by pyrr) with shape (N, 4, 4)."""
+        rotations = rotation_matrices(self._quaternions)
+        m = np.zeros((len(self), 4, 4))
+        m[:, :3, :3] = rotations
+        # pyrr: rotation * translation(-position), stored transposed
+        m[:, 3, :3] = np.einsum("ni,nij->nj", -self._positions, rotations)
+        m[:, 3, 3] = 1.0
+        return m
+
+    def projection_matrices(self) -> np.ndarray:
+        """The perspective projection matrices (as stored by pyrr) with shape (N, 4, 4)."""
+        near, far = self._z_near, self._z_far
+        y_max = near * np.tan(np.radians(self._fovs) / 2.0)
+        x_max = y_max * self._aspect_ratios
+        m = np.zeros((len(self), 4, 4))
+        m[:, 0, 0] = near / x_max
+        m[:, 1, 1] = near / y_max
+        m[:, 2, 2] = -(far + near) / (far - near)
+        m[:, 2, 3] = -1.0
+        m[:, 3, 2] = -2.0 * far * near / (far - near)
+        return m
+
+    def matrices(self) -> np.ndarray:
+        """The projection * view matrices (as stored by pyrr) with shape (N, 4, 4)."""
+        # pyrr stores matrices transposed, so A * B in pyrr is B @ A in numpy
+        return self.view_matrices() @ self.projection_matrices()
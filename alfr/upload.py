@@ -0,0 +1,84 @@
+from alfr.globals import ContextManager
+from alfr.shot import Shot
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, TYPE_CHECKING
+import os
+
+if TYPE_CHECKING:
+    import moderngl
+
+
+class TextureUploader:
+    """Streams shot images to the GPU through a ring of pixel unpack buffers.
+
+    A plain texture upload blocks until the driver has copied the image. Here the image
+    is copied into a pixel unpack buffer instead and the driver transfers it to the
+    texture asynchronously, so uploading overlaps with rendering. Every upload uses the
+    next buffer of the ring; a buffer still in use by a transfer is orphaned.
+    """
+
+    def __init__(
+        self,
+        ctx: "moderngl.Context" = None,
+        slots: int = 3,
+    ):
+        """Create the uploader.
+
+        Args:
+            ctx (moderngl.Context): the OpenGL context of the shots, by default the
+                default context
+            slots (int): the number of pixel unpack buffers
+        """
+        if ctx is None:
+            ctx = ContextManager.get_default_context()
+        self._buffers = [ctx.buffer(reserve=1) for _ in range(slots)]
+        self._next = 0
+
+    def upload(self, shot: Shot):
+        """Start uploading the texture of a shot, decoding its image if necessary."""
+        if shot.resident:
+            return
+        buffer = self._buffers[self._next]
+        self._next = (self._next + 1) % len(self._buffers)
+        shot.preload(buffer)
+
+    def stream(self, shots: Iterable[Shot], workers: int = 1) -> Iterator[Shot]:
+        """Upload shots one by one, decoding the following images in worker threads.
+
+        The generator yields every shot once its upload has been issued, so the caller
+        can render between uploads, e.g., a few shots per frame while a dataset loads.
+
+        Args:
+            shots (Iterable[Shot]): the (lazy) shots to upload
+            workers (int): the number of decoding threads (None: one per core)
+
+        Yields:
+            Shot: the next shot whose texture is being uploaded
+        """
+        workers = workers or os.cpu_count()
+        shots = iter(shots)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # decode a few images ahead, but not the whole dataset at once
+            pending = deque()
+            for shot in shots:
+                pending.append(pool.submit(self._decode, shot))
+                if len(pending) > workers + len(self._buffers):
+                    yield self._upload_decoded(pending.popleft().result())
+            while pending:
+                yield self._upload_decoded(pending.popleft().result())
+
+    def release(self):
+        """Release the pixel unpack buffers."""
+        for buffer in self._buffers:
+            buffer.release()
+        self._buffers = []
+
+    @staticmethod
+    def _decode(shot: Shot) -> Shot:
+        shot.decode()
+        return shot
+
+    def _upload_decoded(self, shot: Shot) -> Shot:
+        self.upload(shot)
+        return shot
@@ -1,16 +1,19 @@
 from .thirdparty.read_write_model import (
     read_model,
 )  # from https://github.com/colmap/colmap
-import moderngl
-from alfr.globals import ContextManager
 from alfr.camera import Camera
 from alfr.shot import Shot
+from alfr.cache import TextureCache
+from alfr.upload import TextureUploader
 from pyrr import Matrix44, Matrix33, Quaternion, Vector3, vector
-from typing import List
+from typing import List, TYPE_CHECKING
 import json
 import os
 import numpy as np
 
+if TYPE_CHECKING:
+    import moderngl
+
 
 def get_from_dict(d: dict, keys: list):
     for key in keys:
@@ -53,13 +56,49 @@ def export_shots_to_json(
         json.dump(data, f)
 
 
+def _load_images(
+    shots: List[Shot],
+    lazy: bool,
+    workers: int,
+    ctx: "moderngl.Context" = None,
+    texture_cache: TextureCache = None,
+) -> List[Shot]:
+    """Decode the images of lazily created shots in a thread pool and upload them.
+
+    Only the decoding runs in the worker threads, the textures are uploaded on the
+    calling (OpenGL) thread in the order of the shots, see ``TextureUploader.stream``.
+    """
+    if lazy or workers == 1:
+        return shots  # the shots were loaded (or are left lazy) by their constructor
+
+    if ctx is None and texture_cache is not None:
+        ctx = texture_cache.ctx  # the context of the shots
+    uploader = TextureUploader(ctx)
+    try:
+        for _ in uploader.stream(shots, workers):
+            pass
+    finally:
+        uploader.release()
+    return shots
+
+
 def load_shots_from_json(
     json_file: str,
     fovy: float = 60.0,
-    ctx: moderngl.Context = ContextManager.get_default_context(),
+    ctx: "moderngl.Context" = None,
+    mipmaps: bool = False,
+    texture_format: str = "rgb8",
+    lazy: bool = False,
+    image_retention: str = "keep",
+    workers: int = 1,
+    image_scale: float = 1.0,
+    texture_cache: TextureCache = None,
 ):
     """
     Loads shots from a json file.
+
+    With ``workers`` other than 1, the images are decoded by that many threads
+    (None: one per core).
     """
     shots = []
     with open(json_file, "r") as f:
@@ -77,19 +116,34 @@ def load_shots_from_json(
                     fov if fov is not None else fovy,
                     shot_aspect_ratio=1.0,
                     ctx=ctx,
+                    mipmaps=mipmaps,
+                    texture_format=texture_format,
+                    lazy=lazy or workers != 1,
+                    image_retention=image_retention,
+                    image_scale=image_scale,
+                    texture_cache=texture_cache,
                 )
                 shots.append(shot)
 
-    return shots
+    return _load_images(shots, lazy, workers, ctx, texture_cache)
 
 
 def load_shots_from_legacy_json(
     json_file: str,
     fovy: float = 60.0,
-    ctx: moderngl.Context = ContextManager.get_default_context(),
+    ctx: "moderngl.Context" = None,
+    mipmaps: bool = False,
+    texture_format: str = "rgb8",
+    lazy: bool = False,
+    image_retention: str = "keep",
+    workers: int = 1,
+    image_scale: float = 1.0,
+    texture_cache: TextureCache = None,
 ):
     """
     Loads shots from a legacy json file.
+
+    See ``load_shots_from_json`` for ``workers``.
     """
     shots = []
     with open(json_file, "r") as f:
@@ -125,10 +179,16 @@ def load_shots_from_legacy_json(
                     fovy,
                     shot_aspect_ratio=1.0,
                     ctx=ctx,
+                    mipmaps=mipmaps,
+                    texture_format=texture_format,
+                    lazy=lazy or workers != 1,
+                    image_retention=image_retention,
+                    image_scale=image_scale,
+                    texture_cache=texture_cache,
                 )
                 shots.append(shot)
 
-    return shots
+    return _load_images(shots, lazy, workers, ctx, texture_cache)
 
 
 # Todo!!
@@ -136,10 +196,19 @@ def load_shots_from_colmap(
     model_folder: str,
     image_folder: str,
     fovy: float = None,
-    ctx: moderngl.Context = ContextManager.get_default_context(),
+    ctx: "moderngl.Context" = None,
+    mipmaps: bool = False,
+    texture_format: str = "rgb8",
+    lazy: bool = False,
+    image_retention: str = "keep",
+    workers: int = 1,
+    image_scale: float = 1.0,
+    texture_cache: TextureCache = None,
 ):
     """
     Loads shots from a colmap.
+
+    See ``load_shots_from_json`` for ``workers``.
     """
 
     cameras, images, points3D = read_model(model_folder)  # read the colmap model
@@ -205,7 +274,13 @@ def load_shots_from_colmap(
             fovy if fovy is not None else cam_fovy,
             shot_aspect_ratio=cam.width / cam.height,
             ctx=ctx,
+            mipmaps=mipmaps,
+            texture_format=texture_format,
+            lazy=lazy or workers != 1,
+            image_retention=image_retention,
+            image_scale=image_scale,
+            texture_cache=texture_cache,
         )
         shots.append(shot)
 
-    return shots
+    return _load_images(shots, lazy, workers, ctx, texture_cache)
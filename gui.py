@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import cv2  # opencv
+import itertools
 import moderngl
 import numpy as np
 from PySide6.QtCore import (
@@ -95,12 +96,21 @@ class RendererThread(QObject):
         self._ctx = moderngl.create_standalone_context()
         self._renderer = alfr.Renderer(resolution=self._resolution, ctx=self._ctx)
 
-        self._shots = alfr.load_shots_from_json(
-            self._file_name, fovy=60.0, ctx=self._ctx
+        # upload the shots while rendering, such that the first frames show up immediately
+        shots = alfr.load_shots_from_json(
+            self._file_name, fovy=60.0, ctx=self._ctx, lazy=True
         )
-        self.shotsLoaded.emit(self._shots)
+        self._uploader = alfr.TextureUploader(ctx=self._ctx)
+        pending = self._uploader.stream(shots, workers=None)
+        self._shots = []
 
         while not self._terminate:
+            if pending is not None:
+                self._shots.extend(itertools.islice(pending, 4))
+                if len(self._shots) == len(shots):
+                    pending = None
+                    self.shotsLoaded.emit(self._shots)
+
             img = self._renderer.integrate(shots=self._shots, vcam=self._camera)
             # img = self._renderer.project_shot(self._shots[0], vcam)
 
@@ -347,11 +357,14 @@ class CameraWidget(QWidget):
     def _on_position_changed(self, vec: Vector3):
         # print(f"Camera position: {self._camera.position}")
         # print(f"Signal position: {vec}")
+        # assign the vector again, such that the camera updates its view matrix
+        self._camera.position = vec
         self.cameraChanged.emit(self._camera)
 
     def _on_rotation_changed(self, q: Quaternion):
         # print(f"Camera rotation: {self._camera.rotation}")
         # print(f"Signal rotation: {q}")
+        self._camera.rotation = q
         self.cameraChanged.emit(self._camera)
 
     def _on_fov_changed(self, value: float):
@@ -0,0 +1,82 @@
+"""
+Checks the footprint culling against points sampled on the focal plane (no OpenGL context needed)
+"""
+
+import numpy as np
+import alfr
+from alfr.culling import shot_footprints
+from alfr.renderer import focal_plane_matrix
+from pyrr import Quaternion
+
+
+def random_cameras(rng, n):
+    # above the focal plane (z = -focus), looking down with some tilt
+    positions = rng.uniform([-40, -40, 0], [40, 40, 5], (n, 3))
+    return [
+        alfr.Camera(
+            position=p,
+            quaternion=Quaternion.from_x_rotation(rng.uniform(-0.8, 0.8))
+            * Quaternion.from_y_rotation(rng.uniform(-0.8, 0.8)),
+        )
+        for p in positions
+    ]
+
+
+def inside(clip):
+    w = clip[..., 3]
+    return (w > 0) & np.all(np.abs(clip[..., :2]) <= w[..., None], axis=-1)
+
+
+def check_footprints(shots, vcam, focus, size=(320, 240)):
+    shot_matrices = alfr.ShotSet(shots).matrices()
+    model = focal_plane_matrix(focus)
+    vcam_matrix = vcam.projection_matrix * vcam.view_matrix
+    visible, boxes = shot_footprints(shot_matrices, model, vcam_matrix, size)
+
+    # points on the focal plane, in the plane's own coordinates (u, v, 0, 1)
+    u, v = np.meshgrid(np.linspace(-80, 80, 321), np.linspace(-80, 80, 321))
+    points = np.stack([u.ravel(), v.ravel(), np.zeros(u.size), np.ones(u.size)], 1)
+    # pyrr stores matrices transposed, so points are row vectors
+    points = points @ np.asarray(model)
+    screen = points @ np.asarray(vcam_matrix)
+    seen = inside(screen)
+    points, screen = points[seen], screen[seen]
+    pixels = (screen[:, :2] / screen[:, 3:] + 1.0) / 2.0 * np.asarray(size)
+
+    for i, matrix in enumerate(shot_matrices):
+        covered = inside(points @ matrix)
+        if not np.any(covered):
+            continue
+        # every shot seen by the virtual camera is drawn, within its scissor box
+        assert visible[i]
+        x, y, width, height = boxes[i]
+        assert np.all(pixels[covered] >= [x - 1, y - 1])
+        assert np.all(pixels[covered] <= [x + width + 1, y + height + 1])
+    return visible
+
+
+def test_footprints_cover_sampled_points():
+    rng = np.random.default_rng(0)
+    shots = random_cameras(rng, 300)
+    for focus in (10.0, 25.0, (12.0, [0.3, 0.0, 1.0])):
+        for _ in range(10):
+            vcam = random_cameras(rng, 1)[0]
+            visible = check_footprints(shots, vcam, focus)
+            # the check is only meaningful if some shots are culled
+            assert 0 < np.count_nonzero(visible) < len(shots)
+
+
+def test_footprints_without_shots():
+    visible, boxes = shot_footprints(
+        np.zeros((0, 4, 4)),
+        focal_plane_matrix(),
+        alfr.Camera().projection_matrix,
+        (8, 8),
+    )
+    assert visible.shape == (0,) and boxes.shape == (0, 4)
+
+
+if __name__ == "__main__":
+    test_footprints_cover_sampled_points()
+    test_footprints_without_shots()
+    print("The footprints cover all sampled points of the focal plane.")
@@ -0,0 +1,59 @@
+"""
+Checks the spatial index against brute-force scans (no OpenGL context needed)
+"""
+
+import numpy as np
+import alfr
+
+
+def random_cameras(rng, n, z_far=300.0):
+    positions = rng.uniform([0, 0, 20], [500, 500, 60], (n, 3))
+    quaternions = rng.normal(size=(n, 4))
+    quaternions /= np.linalg.norm(quaternions, axis=1, keepdims=True)
+    return alfr.ShotSet(
+        [
+            alfr.Camera(position=p, quaternion=q, z_far=z_far)
+            for p, q in zip(positions, quaternions)
+        ]
+    )
+
+
+def brute_force_seeing(shot_set, point):
+    clip = np.append(point, 1.0) @ shot_set.matrices()
+    w = clip[:, 3]
+    return np.flatnonzero((w > 0) & np.all(np.abs(clip[:, :3]) <= w[:, None], axis=1))
+
+
+def test_seeing_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for z_far in (300.0, 10000.0):
+        shot_set = random_cameras(rng, 2000, z_far)
+        index = alfr.ShotIndex(shot_set)
+        for point in rng.uniform([-100, -100, -50], [600, 600, 120], (200, 3)):
+            expected = brute_force_seeing(shot_set, point)
+            assert np.array_equal(index.seeing_indices(point), expected)
+
+            distances = np.linalg.norm(shot_set.positions[expected] - point, axis=1)
+            assert np.array_equal(
+                index.seeing_indices(point, max_distance=80.0),
+                expected[distances <= 80.0],
+            )
+
+
+def test_within_radius_matches_brute_force():
+    rng = np.random.default_rng(1)
+    shot_set = random_cameras(rng, 2000)
+    index = alfr.ShotIndex(shot_set)
+    for point in rng.uniform([-50, -50, 0], [550, 550, 80], (200, 3)):
+        distances = np.linalg.norm(shot_set.positions - point, axis=1)
+        expected = np.flatnonzero(distances <= 40.0)
+        expected = expected[np.argsort(distances[expected], kind="stable")]
+        found = index.within_radius_indices(point, 40.0)
+        assert np.array_equal(np.sort(found), np.sort(expected))
+        assert np.all(np.diff(distances[found]) >= 0)
+
+
+if __name__ == "__main__":
+    test_seeing_matches_brute_force()
+    test_within_radius_matches_brute_force()
+    print("ShotIndex matches the brute-force scans.")
@@ -0,0 +1,100 @@
+"""
+Checks the vectorised ShotSet matrices against the pyrr matrices of the cameras (no OpenGL context needed)
+"""
+
+import numpy as np
+import alfr
+
+
+def random_quaternions(rng, n):
+    quaternions = rng.normal(size=(n, 4))
+    return quaternions / np.linalg.norm(quaternions, axis=1, keepdims=True)
+
+
+def random_cameras(rng, n):
+    positions = rng.uniform(-500, 500, (n, 3))
+    return [
+        alfr.Camera(
+            field_of_view_degrees=fov,
+            ratio=ratio,
+            z_near=near,
+            z_far=far,
+            position=p,
+            quaternion=q,
+        )
+        for p, q, fov, ratio, near, far in zip(
+            positions,
+            random_quaternions(rng, n),
+            rng.uniform(10, 120, n),
+            rng.uniform(0.5, 2.0, n),
+            rng.uniform(0.01, 1.0, n),
+            rng.uniform(100, 10000, n),
+        )
+    ]
+
+
+def assert_matches_cameras(shot_set, cameras):
+    views = np.array([np.asarray(c.view_matrix) for c in cameras])
+    projections = np.array([np.asarray(c.projection_matrix) for c in cameras])
+    matrices = np.array(
+        [np.asarray(c.projection_matrix * c.view_matrix) for c in cameras]
+    )
+    assert np.allclose(shot_set.view_matrices(), views, rtol=1e-12, atol=1e-9)
+    assert np.allclose(shot_set.projection_matrices(), projections, rtol=1e-12)
+    assert np.allclose(shot_set.matrices(), matrices, rtol=1e-12, atol=1e-9)
+
+
+def test_matrices_match_pyrr():
+    rng = np.random.default_rng(0)
+    cameras = random_cameras(rng, 500)
+    assert_matches_cameras(alfr.ShotSet(cameras), cameras)
+
+    # poses give the same matrices as cameras
+    poses = np.hstack([[c.position for c in cameras], [c.rotation for c in cameras]])
+    from_poses = alfr.ShotSet.from_poses(poses, 45.0, 1.5, 0.5, 500.0)
+    assert_matches_cameras(
+        from_poses,
+        [alfr.Camera(45.0, 1.5, 0.5, 500.0, c.position, c.rotation) for c in cameras],
+    )
+
+
+def test_setters_update_matrices():
+    rng = np.random.default_rng(1)
+    cameras = random_cameras(rng, 100)
+    shot_set = alfr.ShotSet(cameras)
+    for camera in cameras:
+        camera.view_matrix_f4, camera.projection_matrix_f4  # fill the caches
+
+    # change every camera through one setter only, such that each setter is checked
+    for i, camera in enumerate(cameras):
+        if i % 4 == 0:
+            camera.position = rng.uniform(-500, 500, 3)
+        elif i % 4 == 1:
+            camera.rotation = random_quaternions(rng, 1)[0]
+        elif i % 4 == 2:
+            camera.fov_degree = rng.uniform(10, 120)
+        else:
+            camera.aspect_ratio = rng.uniform(0.5, 2.0)
+    shot_set.update()
+    assert_matches_cameras(shot_set, cameras)
+
+    # the cached matrices follow the setters
+    for camera in cameras:
+        fresh = alfr.Camera(
+            camera.fov_degree,
+            camera.aspect_ratio,
+            camera.z_near,
+            camera.z_far,
+            camera.position,
+            camera.rotation,
+        )
+        assert np.array_equal(camera.view_matrix, fresh.view_matrix)
+        assert np.array_equal(camera.projection_matrix, fresh.projection_matrix)
+        assert np.array_equal(camera.view_matrix_f4, fresh.view_matrix_f4)
+        assert np.array_equal(camera.projection_matrix_f4, fresh.projection_matrix_f4)
+
+
+if __name__ == "__main__":
+    test_matrices_match_pyrr()
+    test_setters_update_matrices()
+    print("The ShotSet matrices match the pyrr matrices of the cameras.")